@@ -0,0 +1,168 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standins
+
+standins.install()
+
+from mock_robis import API_KEY, MockROBis, serve
+
+
+def build_event(path: str, robis: MockROBis):
+    from sqlalchemy.orm import Session
+
+    db = standins.engine(path)
+    with Session(db) as sess:
+        categories = {}
+        for competitor in robis.competitors:
+            name = competitor["competitor_category"]
+            if name not in categories:
+                categories[name] = standins.Category(name=name)
+            sess.add(standins.Runner(
+                name=f"{competitor["last_name"]}, {competitor["first_name"]}",
+                club=competitor["competitor_club"],
+                si=competitor["si_number"],
+                reg=competitor["competitor_index"],
+                category=categories[name],
+            ))
+        sess.commit()
+    standins.set_basic_info(db, {"robis_api": API_KEY})
+    return db
+
+
+def read_out(db, runner: tuple, controls: int):
+    # Punches as SI readout stores them: the controls in order, then the finish.
+    from sqlalchemy.orm import Session
+
+    si, i = runner
+    with Session(db) as sess:
+        at = standins.TZERO + timedelta(minutes=5 + i % 60)
+        for n in range(controls):
+            at += timedelta(minutes=3, seconds=i % 50)
+            sess.add(standins.Punch(si=si, code=str(31 + n), time=at))
+        sess.add(standins.Punch(si=si, code="F", time=at + timedelta(minutes=1)))
+        sess.commit()
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Finish rush against a local mock ROBis: N readouts/s, end-to-end online push latency and throughput."
+    )
+    argparser.add_argument("--rate", type=float, default=10, help="readouts per second")
+    argparser.add_argument("--duration", type=float, default=20, help="length of the rush in seconds")
+    argparser.add_argument("--drain", type=float, default=30, help="seconds to wait for the last results")
+    argparser.add_argument("--competitors", type=int, default=500)
+    argparser.add_argument("--categories", type=int, default=10)
+    argparser.add_argument("--controls", type=int, default=5)
+    argparser.add_argument("--latency-ms", type=float, default=50)
+    argparser.add_argument("--jitter-ms", type=float, default=50)
+    argparser.add_argument("--error-rate", type=float, default=0)
+    args = argparser.parse_args()
+
+    robis = MockROBis(args.competitors, args.categories, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                      error_rate=args.error_rate)
+    server = serve(robis)
+
+    # robisnet reads the URL at import time.
+    os.environ["ARDF_ROBIS_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication, QWidget
+
+    import robisnet
+    import robistrack
+    import robiswin
+
+    app = QApplication([])
+    workdir = tempfile.TemporaryDirectory()
+
+    mw = QWidget()
+    mw.db = build_event(os.path.join(workdir.name, "event.sqlite"), robis)
+    client = robisnet.ROBisClient(mw)
+    tracker = robistrack.ROBisChangeTracker(mw)
+    tracker.install()
+    win = robiswin.ROBisWindow(mw, SimpleNamespace(get_client=lambda: client, get_tracker=lambda: tracker))
+    win.api_edit.setText(API_KEY)
+
+    runners = [(competitor["si_number"], i) for i, competitor in enumerate(robis.competitors)]
+    regs = {competitor["si_number"]: competitor["competitor_index"] for competitor in robis.competitors}
+    total = min(len(runners), int(args.rate * args.duration))
+    readouts = {}
+    state = SimpleNamespace(next=0, rush_end=0.0, deadline=0.0)
+
+    def tick():
+        if state.next >= total:
+            rush.stop()
+            state.rush_end = time.perf_counter()
+            state.deadline = state.rush_end + args.drain
+            check.start()
+            return
+        runner = runners[state.next]
+        state.next += 1
+        read_out(mw.db, runner, args.controls)
+        readouts[regs[runner[0]]] = time.perf_counter()
+        win._send_online_readout(mw.db, runner[0])
+
+    def done():
+        with robis.lock:
+            received = sum(1 for reg in readouts if reg in robis.first_received)
+        if received == len(readouts) or time.perf_counter() > state.deadline:
+            check.stop()
+            app.quit()
+
+    rush = QTimer()
+    rush.setInterval(max(1, int(1000 / args.rate)))
+    rush.timeout.connect(tick)
+    check = QTimer()
+    check.setInterval(50)
+    check.timeout.connect(done)
+
+    started = time.perf_counter()
+    rush.start()
+    app.exec()
+    finished = time.perf_counter()
+    win.close()
+
+    with robis.lock:
+        latencies = [(robis.first_received[reg] - at) * 1000 for reg, at in readouts.items()
+                     if reg in robis.first_received]
+        last = max(robis.first_received.values(), default=finished)
+    stats = robis.stats()
+    snapshot = win.metrics.snapshot(win.client.stats)
+
+    print(f"readouts           {len(readouts)} in {state.rush_end - started:.1f} s "
+          f"({len(readouts) / max(state.rush_end - started, 1e-9):.1f}/s)")
+    print(f"results received   {len(latencies)}/{len(readouts)}")
+    print(f"throughput         {len(latencies) / max(last - started, 1e-9):.1f} results/s")
+    print(f"latency ms         p50 {percentile(latencies, 0.5):.0f}  p90 {percentile(latencies, 0.9):.0f}  "
+          f"p99 {percentile(latencies, 0.99):.0f}  max {max(latencies, default=0):.0f}  "
+          f"mean {statistics.fmean(latencies) if latencies else 0:.0f}")
+    print(f"requests           {sum(stats["requests"].values())} ({stats["errors"]} injected errors), "
+          f"{stats["bytes_received"] / 1024:.0f} KiB received by the server")
+    print()
+    print(f"{"operation":<36} {"count":>6} {"avg ms":>8} {"max ms":>8}")
+    for row in snapshot["timings"]:
+        print(f"{row["name"]:<36} {row["count"]:>6} {row["avg_ms"]:>8.1f} {row["max_ms"]:>8.1f}")
+
+    server.shutdown()
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def competitor(i: int) -> dict:
+    return {
+        "competitor_index": f"CZE{i:05d}",
+        "si_number": 8000000 + i,
+        "last_name": f"Novák{i}",
+        "first_name": "Jan",
+        "category_name": f"M{20 + i % 10}",
+        "result": {
+            "run_time": "01:23:45",
+            "punch_count": 5,
+            "result_status": "OK",
+            "punches": [
+                {"code": str(31 + n), "control_type": "CONTROL", "punch_status": "OK", "split_time": "00:12:34"}
+                for n in range(5)
+            ] + [{"code": "F", "control_type": "FINISH", "punch_status": "OK", "split_time": "00:01:02"}],
+        },
+    }
+
+
+def dumps_whole(items: list[dict]) -> bytes:
+    # Previous path: one json.dumps over the whole batch, then encode and copy into the request buffer.
+    return bytes(json.dumps(items).encode("utf-8"))
+
+
+def join_serialized(serialized: list[bytes]) -> bytes:
+    # Current path: every competitor is serialized once when queued, a flush only joins the bytes.
+    return b"[" + b",".join(serialized) + b"]"
+
+
+def measure(fn, *args) -> tuple[float, int, int]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    body = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak, len(body)
+
+
+def measure_uploads(sizes: list[int]):
+    # The real exporters and upload path, run on the ARDFEvent stand-ins. The ROBis stub runs in its own
+    # process so that receiving the bodies does not count towards the peak memory.
+    import standins
+
+    standins.install()
+
+    from bench_finish_rush import build_event
+    from bench_suite import add_courses, wait
+    from mock_robis import MockROBis
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_robis.py"), "--port", "0"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    url = re.search(r"http://\S+", server.stdout.readline()).group(0)
+    os.environ["ARDF_ROBIS_URL"] = url
+    # Building the events must not start online pushes while the uploads are measured.
+    os.environ["ARDF_ROBIS_DIRTY_MS"] = str(24 * 3600 * 1000)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PySide6.QtWidgets import QApplication, QWidget
+
+    import robis as robisplugin
+    from exports import json_results as res_json
+    from exports import json_startlist as stl_json
+
+    def bytes_received() -> int:
+        with urllib.request.urlopen(f"{url}/_stats") as response:
+            return json.load(response)["bytes_received"]
+
+    app = QApplication([])
+    workdir = tempfile.TemporaryDirectory()
+    mw = QWidget()
+    mw.db = standins.engine()
+    win = robisplugin.ROBisPlugin(mw).get_robis_win()
+
+    def upload(fn):
+        fn()
+        wait(app, lambda: not win.outbox_inflight and not win._get_outbox().count())
+
+    print()
+    print("Peak memory counts Python allocations only, the QByteArray copy Qt makes for the request is not included.")
+    print(f"{"N":>6} {"path":<22} {"ms":>9} {"peak KiB":>10} {"body KiB":>10}")
+    for size in sizes:
+        mw.db = build_event(os.path.join(workdir.name, f"event-{size}.sqlite"), MockROBis(size, max(10, min(100, size // 50))))
+        add_courses(mw.db, 300, 15, size)
+        win._show()
+
+        for name, fn, sent in (
+                ("stl_json.export", lambda: stl_json.export(mw.db).encode("utf-8"), False),
+                ("res_json.export", lambda: res_json.export(mw.db).encode("utf-8"), False),
+                ("_upload_stlcontrols", lambda: upload(win._upload_stlcontrols), True),
+                ("_upload_res", lambda: upload(win._upload_res), True),
+        ):
+            win._get_outbox().conn.execute("DELETE FROM uploaded")
+            received = bytes_received()
+            elapsed, peak, length = measure(lambda: fn() or b"")
+            if sent:
+                length = bytes_received() - received
+            print(f"{size:>6} {name:<22} {elapsed:>9.2f} {peak / 1024:>10.0f} {length / 1024:>10.0f}")
+
+    win.close()
+    server.terminate()
+    workdir.cleanup()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Online/final results payload build time and peak memory.")
+    argparser.add_argument("sizes", nargs="*", type=int, default=[100, 1000, 10000])
+    argparser.add_argument("--no-uploads", action="store_true", help="only the synthetic batch bodies")
+    args = argparser.parse_args()
+
+    print(f"{"N":>6} {"method":<16} {"ms":>9} {"peak KiB":>10} {"body KiB":>10}")
+    for size in args.sizes:
+        items = [competitor(i) for i in range(size)]
+        serialized = [json.dumps(item, sort_keys=True, separators=(",", ":")).encode("utf-8") for item in items]
+        body = join_serialized(serialized)
+
+        for name, fn, arg in (
+                ("dumps", dumps_whole, items),
+                ("join", join_serialized, serialized),
+                ("join+gzip", lambda s: gzip.compress(join_serialized(s), compresslevel=6), serialized),
+                ("gzip only", lambda b: gzip.compress(b, compresslevel=6), body),
+        ):
+            elapsed, peak, length = measure(fn, arg)
+            print(f"{size:>6} {name:<16} {elapsed:>9.2f} {peak / 1024:>10.0f} {length / 1024:>10.0f}")
+
+    if not args.no_uploads:
+        measure_uploads(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
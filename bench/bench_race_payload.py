@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standins
+
+standins.install()
+
+from sqlalchemy import Select, event
+from sqlalchemy.orm import Session
+
+from robisserialize import export_race
+
+
+def legacy_export_race(db) -> dict:
+    # The categories/aliases builder as it was in ROBisWindow._upload_stlcontrols.
+    cats = []
+
+    with Session(db) as sess:
+        for dbcat in sess.scalars(Select(standins.Category)).all():
+            cat = {"category_name": dbcat.name, "category_control_points": []}
+            for control in dbcat.controls:
+                cat["category_control_points"].append(
+                    {"si_code": control.code, "control_type": "BEACON" if control.mandatory else "CONTROL"})
+            cats.append(cat)
+
+        aliases = []
+
+        for cont in sess.scalars(Select(standins.Control)).all():
+            for alias in aliases:
+                if alias["alias_si_code"] == cont.code:
+                    alias["alias_name"] += f"/{cont.name}"
+                    break
+            else:
+                aliases.append({"alias_si_code": cont.code, "alias_name": cont.name})
+
+    return {"categories": cats, "aliases": aliases}
+
+
+def build(categories: int, controls: int, per_category: int):
+    db = standins.engine()
+    with Session(db) as sess:
+        pool = [
+            standins.Control(name=f"K{i}", code=str(31 + i % (controls // 2 or 1)), mandatory=i % 10 == 0)
+            for i in range(controls)
+        ]
+        sess.add_all(pool)
+        sess.add_all(
+            standins.Category(name=f"C{i}", controls=[pool[(i + j) % controls] for j in range(per_category)])
+            for i in range(categories)
+        )
+        sess.commit()
+    return db
+
+
+def measure(db, fn) -> tuple[float, int, dict]:
+    queries = 0
+
+    def count(*_):
+        nonlocal queries
+        queries += 1
+
+    event.listen(db, "before_cursor_execute", count)
+    started = time.perf_counter()
+    payload = fn(db)
+    elapsed = time.perf_counter() - started
+    event.remove(db, "before_cursor_execute", count)
+    return elapsed * 1000, queries, payload
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Categories/aliases payload build time and query count.")
+    argparser.add_argument("--per-category", type=int, default=12)
+    args = argparser.parse_args()
+
+    print(f"{"categories":>10} {"controls":>8} {"method":<8} {"ms":>9} {"queries":>8}")
+    for categories, controls in ((20, 50), (100, 300), (300, 800)):
+        db = build(categories, controls, args.per_category)
+        legacy = measure(db, legacy_export_race)
+        current = measure(db, export_race)
+        assert legacy[2] == current[2], "payloads differ"
+        for name, (elapsed, queries, _) in (("legacy", legacy), ("current", current)):
+            print(f"{categories:>10} {controls:>8} {name:<8} {elapsed:>9.2f} {queries:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standins
+
+standins.install()
+
+from PySide6.QtCore import QObject
+from sqlalchemy import event
+
+from bench_finish_rush import build_event, read_out
+from mock_robis import API_KEY, MockROBis
+from robismetrics import ROBisMetrics
+from robiswin import ROBisReadoutWorker
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Online \"update all\" time and SQL query count.")
+    argparser.add_argument("--competitors", type=int, default=600)
+    argparser.add_argument("--categories", nargs="*", type=int, default=[5, 10, 20, 40])
+    argparser.add_argument("--controls", type=int, default=8)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    print(f"{"categories":>10} {"ms":>9} {"queries":>8} {"payload KiB":>12}")
+    for categories in args.categories:
+        workdir = tempfile.TemporaryDirectory()
+        robis = MockROBis(args.competitors, categories)
+        db = build_event(os.path.join(workdir.name, "event.sqlite"), robis)
+        for i, competitor in enumerate(robis.competitors):
+            read_out(db, (competitor["si_number"], i), args.controls)
+
+        parent = QObject()
+        parent.metrics = ROBisMetrics()
+        queries = []
+        event.listen(db, "before_cursor_execute", lambda *_: queries.append(1))
+
+        best = None
+        for _ in range(args.repeat):
+            # A fresh worker each round, the serializer cache would otherwise hide the work.
+            worker = ROBisReadoutWorker(parent)
+            payload = []
+            worker.results.connect(lambda apikey, changed, all: payload.extend(changed))
+            queries.clear()
+            started = time.perf_counter()
+            worker.refresh_all(db, API_KEY)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = min(best or elapsed, elapsed)
+
+        size = sum(len(serialized) for _, serialized, _ in payload)
+        print(f"{categories:>10} {best:>9.1f} {len(queries):>8} {size / 1024:>12.0f}")
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ["robiswin", "robisnet", "robiswebconfig", "sqlalchemy", "dateutil", "jwt", "PySide6.QtNetwork"]
+
+CHILD = """
+import os, sys, time
+sys.path[:0] = [{bench!r}, {root!r}]
+import standins
+standins.install()
+from PySide6.QtWidgets import QApplication, QWidget
+# ARDFEvent has these loaded before plugins, they are not part of the plugin's cost.
+import qtawesome
+app = QApplication([])
+qtawesome.icon("mdi6.web")
+mw = QWidget()
+mw.db = standins.engine()
+heavy = {heavy!r}
+preloaded = {{name for name in heavy if name in sys.modules}}
+started = time.perf_counter()
+import robis
+plugin = robis.fileplugin(mw)
+plugin.on_startup()
+startup = (time.perf_counter() - started) * 1000
+loaded = [name for name in heavy if name in sys.modules and name not in preloaded]
+started = time.perf_counter()
+plugin.get_robis_win()
+first_use = (time.perf_counter() - started) * 1000
+print(startup, first_use, ",".join(loaded))
+"""
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Plugin startup time in a fresh interpreter, against a budget.")
+    argparser.add_argument("--runs", type=int, default=5)
+    argparser.add_argument("--budget-ms", type=float, default=20)
+    args = argparser.parse_args()
+
+    bench = os.path.dirname(os.path.abspath(__file__))
+    child = CHILD.format(bench=bench, root=os.path.dirname(bench), heavy=HEAVY)
+    env = {**os.environ, "QT_QPA_PLATFORM": os.environ.get("QT_QPA_PLATFORM", "offscreen")}
+
+    startups = []
+    first_uses = []
+    loaded = ""
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", child], env=env, capture_output=True, text=True, check=True)
+        startup, first_use, loaded = (out.stdout.strip().splitlines()[-1].split(" ") + [""])[:3]
+        startups.append(float(startup))
+        first_uses.append(float(first_use))
+
+    startup = statistics.median(startups)
+    print(f"startup            {startup:.1f} ms (median of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print(f"first tab open     {statistics.median(first_uses):.1f} ms")
+    print(f"loaded at startup  {loaded or "-"}")
+    if startup > args.budget_ms:
+        print("OVER BUDGET")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standins
+
+standins.install()
+
+from mock_robis import API_KEY, MockROBis, serve
+
+SIZES = [50, 500, 5000]
+
+
+def categories_for(runners: int) -> int:
+    return max(10, min(100, runners // 50))
+
+
+def add_courses(db, controls: int, per_category: int, seed: int):
+    # Hundreds of controls shared by the categories, plus punches for every other runner.
+    from sqlalchemy import Select, insert
+    from sqlalchemy.orm import Session
+
+    rnd = random.Random(seed)
+    with Session(db) as sess:
+        pool = [standins.Control(name=f"K{n}", code=str(31 + n % 120), mandatory=n % 50 == 0) for n in range(controls)]
+        sess.add_all(pool)
+        courses = {}
+        for category in sess.scalars(Select(standins.Category)).all():
+            category.controls = rnd.sample(pool, min(per_category, len(pool)))
+            courses[category.id] = [control.code for control in category.controls]
+
+        punches = []
+        for i, runner in enumerate(sess.scalars(Select(standins.Runner)).all()):
+            if i % 2 or runner.category_id not in courses:
+                continue
+            at = standins.TZERO + timedelta(minutes=i % 90)
+            for code in courses[runner.category_id]:
+                at += timedelta(minutes=2, seconds=rnd.randrange(60))
+                punches.append({"si": runner.si, "code": code, "time": at})
+            punches.append({"si": runner.si, "code": "F", "time": at + timedelta(minutes=1)})
+        if punches:
+            sess.execute(insert(standins.Punch), punches)
+        sess.commit()
+
+
+def wait(app, done, timeout: float = 120):
+    from PySide6.QtCore import QEventLoop
+
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("path did not finish")
+        app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 5)
+
+
+def timed(fn, repeat: int = 1, setup=None) -> float:
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs)
+
+
+def run_size(app, win, server, workdir: str, runners: int, controls: int, per_category: int, repeat: int) -> dict:
+    from sqlalchemy import Update
+
+    import robiswin
+
+    robis = MockROBis(runners, categories_for(runners))
+    server.RequestHandlerClass.robis = robis
+    win.mw.db = standins.engine(os.path.join(workdir, f"event-{runners}.sqlite"))
+    standins.set_basic_info(win.mw.db, {"robis_api": API_KEY})
+    win._show()
+    timings = {}
+
+    def drained():
+        return not win.outbox_inflight and not win._get_outbox().count()
+
+    def download():
+        win._download()
+        wait(app, lambda: win.download_call is None and win.import_thread is None)
+
+    timings["download+import"] = timed(download, repeat)
+
+    add_courses(win.mw.db, controls, per_category, runners)
+
+    def upload():
+        win._upload_stlcontrols()
+        wait(app, drained)
+
+    # Unchanged uploads are skipped before they reach the network, forget what was sent.
+    timings["upload startlist+race"] = timed(
+        upload, repeat, lambda: win._get_outbox().conn.execute("DELETE FROM uploaded")
+    )
+
+    emitted = []
+    win.readout_worker.results.connect(lambda apikey, changed, all: emitted.append(len(changed)))
+    read_out = [competitor["si_number"] for i, competitor in enumerate(robis.competitors) if not i % 2]
+
+    def online(si: int, all: bool):
+        count = len(emitted)
+        win._send_online_readout(win.mw.db, si, all)
+        wait(app, lambda: len(emitted) > count and drained())
+
+    timings["online readout"] = timed(lambda: online(read_out[len(emitted) % len(read_out)], False), repeat * 5)
+    timings["online update all"] = timed(lambda: online(0, True), repeat, win.online_sent.clear)
+
+    ochecklist = robis.get("/api/ochecklist/", {}, {})[1]
+
+    def ochecklist_reset():
+        with win.mw.db.begin() as conn:
+            conn.execute(Update(standins.Runner).values(manual_dns=False, ocheck_processed=False))
+
+    def ochecklist_pass():
+        poller = robiswin.ROBisOChecklistPoller(win)
+        poller.apply(ochecklist)
+        poller.deleteLater()
+
+    timings["ochecklist DB pass"] = timed(ochecklist_pass, repeat, ochecklist_reset)
+
+    return timings
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Times the plugin's data paths on synthetic events against a local ROBis stub."
+    )
+    argparser.add_argument("sizes", nargs="*", type=int, default=SIZES, help="runners per event")
+    argparser.add_argument("--controls", type=int, default=300)
+    argparser.add_argument("--per-category", type=int, default=15, help="controls on each category's course")
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("--save", metavar="JSON", help="store the timings as the new baseline")
+    argparser.add_argument("--baseline", metavar="JSON", help="fail if a path is slower than this baseline allows")
+    argparser.add_argument("--threshold", type=float, default=1.3, help="allowed slowdown against the baseline")
+    argparser.add_argument("--slack-ms", type=float, default=5, help="slowdowns smaller than this are noise")
+    args = argparser.parse_args()
+
+    server = serve(MockROBis(0))
+    os.environ["ARDF_ROBIS_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["ARDF_ROBIS_FLUSH_MS"] = "0"
+    # Edits made by the benchmark itself must not push results while another path is timed.
+    os.environ["ARDF_ROBIS_DIRTY_MS"] = str(24 * 3600 * 1000)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PySide6.QtCore import QStandardPaths
+    from PySide6.QtWidgets import QApplication, QWidget
+
+    import robis as robisplugin
+
+    app = QApplication([])
+    # Download snapshots go to a throwaway location instead of the user's data directory.
+    QStandardPaths.setTestModeEnabled(True)
+    workdir = tempfile.TemporaryDirectory()
+
+    mw = QWidget()
+    mw.db = standins.engine()
+    plugin = robisplugin.ROBisPlugin(mw)
+    win = plugin.get_robis_win()
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run_size(app, win, server, workdir.name, size, args.controls, args.per_category,
+                                      args.repeat)
+
+    win.close()
+    server.shutdown()
+
+    paths = list(next(iter(results.values())))
+    print(f"{"path":<24}" + "".join(f"{f"{size} ms":>12}" for size in results))
+    for path in paths:
+        print(f"{path:<24}" + "".join(f"{timings[path]:>12.1f}" for timings in results.values()))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = [
+            f"{path} @ {size}: {timings[path]:.1f} ms > {baseline[size][path]:.1f} ms x {args.threshold}"
+            for size, timings in results.items() if size in baseline
+            for path in timings if path in baseline[size]
+            and timings[path] > max(baseline[size][path] * args.threshold, baseline[size][path] + args.slack_ms)
+        ]
+        if regressions:
+            print("\nREGRESSIONS")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"\nno path slower than {args.threshold}x the baseline")
+
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_KEY = "mock-race-1"
+
+
+def competitor(i: int, categories: int) -> dict:
+    return {
+        "competitor_index": f"CZE{i:05d}",
+        "last_name": f"Novák{i}",
+        "first_name": "Jan",
+        "competitor_club": f"ABC{i % 50:02d}",
+        "si_number": 8000000 + i,
+        "competitor_category": f"M{20 + i % categories}",
+    }
+
+
+def token(hours: int = 12) -> str:
+    # Unsigned JWT, the plugin only reads the exp claim.
+    def part(value: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).rstrip(b"=").decode()
+
+    return f"{part({"alg": "none", "typ": "JWT"})}.{part({"exp": int(time.time()) + hours * 3600})}.mock"
+
+
+def token_valid(cookie_header: str | None) -> bool:
+    for cookie in (cookie_header or "").split("; "):
+        name, _, value = cookie.partition("=")
+        if name == "authToken" and value.count(".") == 2:
+            payload = value.split(".")[1]
+            try:
+                claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            except ValueError:
+                return False
+            return claims.get("exp", 0) > time.time()
+    return False
+
+
+class MockROBis:
+    def __init__(self, competitors: int = 500, categories: int = 10, events: int = 20, latency_ms: float = 0,
+                 jitter_ms: float = 0, error_rate: float = 0, error_status: int = 503, seed: int = 0):
+        self.competitors = [competitor(i, categories) for i in range(competitors)]
+        self.categories = categories
+        self.events = events
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.errors = 0
+            self.bytes_received = 0
+            # competitor_index -> (perf_counter of the latest receipt, result)
+            self.results = {}
+            # competitor_index -> perf_counter of the first receipt
+            self.first_received = {}
+            self.uploads = {}
+
+    def delay(self):
+        with self.lock:
+            delay = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+            fail = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        return fail
+
+    def race(self) -> dict:
+        return {
+            "race_name": "Mock závod",
+            "race_start": datetime.combine(date.today(), datetime.min.time()).replace(hour=10).astimezone().isoformat(),
+            "race_time_limit": 120,
+            "race_band": "M2",
+            "categories": [{"category_name": f"M{20 + i}"} for i in range(self.categories)],
+            "competitors": self.competitors,
+        }
+
+    def get(self, path: str, query: dict, headers) -> tuple[int, object]:
+        if path in ("/api/event/", "/api/event/edit/") and not token_valid(headers.get("Cookie")):
+            return 401, {"error": "login required"}
+        if path == "/api/event/":
+            today = date.today()
+            return 200, [
+                {
+                    "id": i + 1,
+                    "event_name": f"Mock soutěž {i + 1}",
+                    "event_date_start": (today + timedelta(days=i - self.events // 2)).isoformat(),
+                    "event_closed": i % 7 == 6,
+                }
+                for i in range(self.events)
+            ]
+        if path == "/api/event/edit/":
+            eid = query.get("id", ["1"])[0]
+            return 200, {
+                "races": [{"race_name": "Soutěž", "race_date": date.today().isoformat(), "race_api_key": ""}] + [
+                    {"race_name": f"Etapa {n}", "race_date": date.today().isoformat(),
+                     "race_api_key": f"mock-race-{eid}-{n}" if eid != "1" or n > 1 else API_KEY}
+                    for n in range(1, 3)
+                ]
+            }
+        if path == "/api/":
+            if not headers.get("Race-Api-Key"):
+                return 401, {"error": "missing Race-Api-Key"}
+            name = query.get("name", [""])[0]
+            if name == "event":
+                return 200, {"event_name": "Mock soutěž", "event_organiser": "ABC"}
+            if name == "race":
+                return 200, self.race()
+        if path == "/api/ochecklist/":
+            return 200, [
+                {
+                    "competitor_index": c["competitor_index"][3:].lstrip("0") or "0",
+                    "competitor_name": f"{c["last_name"]} {c["first_name"]}",
+                    "competitor_status": "DNS" if i % 40 == 0 else "STARTED",
+                    "competitor_new_si_number": None,
+                }
+                for i, c in enumerate(self.competitors[: len(self.competitors) // 4])
+            ]
+        return 404, {"error": "not found"}
+
+    def upload(self, method: str, path: str, query: dict, body: bytes) -> tuple[int, object]:
+        if path == "/api/login/":
+            return 200, {"status": "ok"}
+        if path not in ("/api/results/", "/api/startlist/", "/api/race/"):
+            return 404, {"error": "not found"}
+
+        payload = json.loads(body)
+        received = time.perf_counter()
+        with self.lock:
+            self.uploads[f"{method} {path}"] = self.uploads.get(f"{method} {path}", 0) + 1
+            if path == "/api/results/" and query.get("name") == ["json"]:
+                for result in payload:
+                    self.results[result["competitor_index"]] = (received, result)
+                    self.first_received.setdefault(result["competitor_index"], received)
+        return 200, {"status": "ok", "count": len(payload) if isinstance(payload, list) else 1}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "uploads": dict(self.uploads),
+                "errors": self.errors,
+                "bytes_received": self.bytes_received,
+                "results": len(self.results),
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    robis: MockROBis = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status: int, payload, cookies: dict | None = None):
+        body = json.dumps(payload).encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if status == 200 and self.command == "GET" and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.command == "GET":
+            self.send_header("ETag", etag)
+        for name, value in (cookies or {}).items():
+            self.send_header("Set-Cookie", f"{name}={value}; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        robis = self.robis
+        with robis.lock:
+            name = f"{self.command} {url.path}"
+            robis.requests[name] = robis.requests.get(name, 0) + 1
+            robis.bytes_received += len(body)
+
+        if url.path == "/_stats":
+            return self.respond(200, robis.stats())
+
+        if robis.delay():
+            with robis.lock:
+                robis.errors += 1
+            return self.respond(robis.error_status, {"error": "injected failure"})
+
+        if self.command == "GET":
+            status, payload = robis.get(url.path, query, self.headers)
+        else:
+            status, payload = robis.upload(self.command, url.path, query, body)
+        self.respond(status, payload, {"authToken": token()} if url.path == "/api/login/" else None)
+
+    do_GET = handle_request
+    do_POST = handle_request
+    do_PUT = handle_request
+
+
+def serve(robis: MockROBis, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    handler = type("BoundMockHandler", (MockHandler,), {"robis": robis})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Local stand-in for the ROBis API.")
+    argparser.add_argument("--host", default="127.0.0.1")
+    argparser.add_argument("--port", type=int, default=8765)
+    argparser.add_argument("--competitors", type=int, default=500)
+    argparser.add_argument("--categories", type=int, default=10)
+    argparser.add_argument("--events", type=int, default=20)
+    argparser.add_argument("--latency-ms", type=float, default=0)
+    argparser.add_argument("--jitter-ms", type=float, default=0)
+    argparser.add_argument("--error-rate", type=float, default=0)
+    argparser.add_argument("--error-status", type=int, default=503)
+    args = argparser.parse_args()
+
+    robis = MockROBis(args.competitors, args.categories, args.events, args.latency_ms, args.jitter_ms,
+                      args.error_rate, args.error_status)
+    server = serve(robis, args.host, args.port)
+    print(f"Mock ROBis on http://{args.host}:{server.server_port} (race API key {API_KEY}), "
+          f"start ARDFEvent with ARDF_ROBIS_URL set to it")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
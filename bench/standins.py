@@ -0,0 +1,193 @@
+import json
+import sys
+import types
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, Select, String, Table, create_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, relationship
+
+TZERO = datetime(2026, 5, 1, 10, 0)
+BANDS = ["2m", "80m", "2m+80m"]
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+category_controls = Table(
+    "category_controls",
+    Base.metadata,
+    Column("category_id", ForeignKey("categories.id"), primary_key=True),
+    Column("control_id", ForeignKey("controls.id"), primary_key=True),
+)
+
+
+class Control(Base):
+    __tablename__ = "controls"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String)
+    code: Mapped[str] = mapped_column(String)
+    mandatory: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class Category(Base):
+    __tablename__ = "categories"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String)
+    display_controls: Mapped[str] = mapped_column(String, default="")
+    controls: Mapped[list[Control]] = relationship(secondary=category_controls)
+    runners: Mapped[list["Runner"]] = relationship(back_populates="category")
+
+
+class Runner(Base):
+    __tablename__ = "runners"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String)
+    club: Mapped[str] = mapped_column(String, default="")
+    si: Mapped[int] = mapped_column(Integer, default=0)
+    reg: Mapped[str] = mapped_column(String, default="")
+    call: Mapped[str] = mapped_column(String, default="")
+    manual_dns: Mapped[bool] = mapped_column(Boolean, default=False)
+    ocheck_processed: Mapped[bool] = mapped_column(Boolean, default=False)
+    category_id: Mapped[int | None] = mapped_column(ForeignKey("categories.id"))
+    category: Mapped[Category | None] = relationship(back_populates="runners")
+
+
+class Punch(Base):
+    __tablename__ = "punches"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    si: Mapped[int] = mapped_column(Integer, index=True)
+    code: Mapped[str] = mapped_column(String)
+    time = Column(DateTime)
+
+
+def format_delta(delta: timedelta) -> str:
+    seconds = int(delta.total_seconds())
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class Result:
+    __slots__ = ("reg", "si", "name", "start", "finish", "time", "tx", "status", "order")
+
+    def __init__(self, runner: Runner, punches: list[Punch]):
+        self.reg = runner.reg
+        self.si = runner.si
+        self.name = runner.name
+        self.start = TZERO
+        self.order = [(punch.code, punch.time, "OK") for punch in punches if punch.code != "F"]
+        self.finish = next((punch.time for punch in punches if punch.code == "F"), None)
+        self.time = int((self.finish - self.start).total_seconds()) if self.finish else 0
+        self.tx = len(self.order)
+        self.status = "OK" if self.finish else ("DNS" if runner.manual_dns else "DNF")
+
+
+def calculate_category(db, category_name: str) -> list[Result]:
+    # Same access pattern as ARDFEvent: the category's runners, then their punches, then ordering.
+    with Session(db) as sess:
+        runners = sess.scalars(Select(Runner).join(Runner.category).where(Category.name == category_name)).all()
+        punches = {}
+        for punch in sess.scalars(
+                Select(Punch).where(Punch.si.in_([runner.si for runner in runners])).order_by(Punch.time)):
+            punches.setdefault(punch.si, []).append(punch)
+        category_results = [Result(runner, punches.get(runner.si, [])) for runner in runners]
+    category_results.sort(key=lambda result: (result.status != "OK", -result.tx, result.time))
+    return category_results
+
+
+basic_info = {}
+config = {}
+
+
+def get_basic_info(db) -> dict:
+    return basic_info.setdefault(str(db.url), {"robis_api": "", "date_tzero": TZERO.isoformat()})
+
+
+def set_basic_info(db, values: dict):
+    get_basic_info(db).update(values)
+
+
+def get_config_value(name: str):
+    return config.get(name)
+
+
+def set_config_value(name: str, value):
+    config[name] = value
+
+
+def export_startlist(db) -> str:
+    with Session(db) as sess:
+        return json.dumps([
+            {"competitor_index": runner.reg, "si_number": runner.si, "category_name": runner.category.name,
+             "start_time": TZERO.isoformat()}
+            for runner in sess.scalars(Select(Runner)).all() if runner.category
+        ])
+
+
+def export_results(db) -> str:
+    with Session(db) as sess:
+        names = sess.scalars(Select(Category.name)).all()
+    return json.dumps([
+        {"competitor_index": result.reg, "category_name": name, "run_time": format_delta(timedelta(seconds=result.time)),
+         "result_status": result.status}
+        for name in names for result in calculate_category(db, name)
+    ])
+
+
+class Plugin:
+    def __init__(self, mw):
+        self.mw = mw
+        self.tabs = []
+        self.menus = []
+
+    def register_mw_tab(self, widget, icon):
+        self.tabs.append((widget, icon))
+
+    def register_ww_menu(self, name: str):
+        self.menus.append(name)
+
+
+def engine(path: str = ":memory:"):
+    db = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(db)
+    return db
+
+
+def install():
+    # The plugin imports these ARDFEvent modules by name; the benchmarks run against these stand-ins.
+    models = types.ModuleType("models")
+    models.Base = Base
+    models.Category = Category
+    models.Control = Control
+    models.Runner = Runner
+    models.Punch = Punch
+    sys.modules["models"] = models
+
+    results = types.ModuleType("results")
+    results.format_delta = format_delta
+    results.calculate_category = calculate_category
+    sys.modules["results"] = results
+
+    api = types.ModuleType("api")
+    api.BANDS = BANDS
+    api.get_basic_info = get_basic_info
+    api.set_basic_info = set_basic_info
+    api.get_config_value = get_config_value
+    api.set_config_value = set_config_value
+    sys.modules["api"] = api
+
+    plugin = types.ModuleType("plugin")
+    plugin.Plugin = Plugin
+    sys.modules["plugin"] = plugin
+
+    exports = types.ModuleType("exports")
+    exports.json_results = types.ModuleType("exports.json_results")
+    exports.json_results.export = export_results
+    exports.json_startlist = types.ModuleType("exports.json_startlist")
+    exports.json_startlist.export = export_startlist
+    sys.modules["exports"] = exports
+    sys.modules["exports.json_results"] = exports.json_results
+    sys.modules["exports.json_startlist"] = exports.json_startlist
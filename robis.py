@@ -1,13 +1,31 @@
 import time
 
-import jwt
 import qtawesome as qta
-from PySide6.QtWidgets import QMessageBox
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QMessageBox, QVBoxLayout, QWidget
 
 import api
 import plugin
-import robiswebconfig
-import robiswin
+
+# How often the plugin looks for a newly opened event until the ROBis window exists.
+EVENT_CHECK_MS = 5000
+
+
+class ROBisTab(QWidget):
+    # Stands in for ROBisWindow in the main window until the tab is first opened.
+    def __init__(self, plugin):
+        super().__init__()
+        self.plugin = plugin
+        lay = QVBoxLayout()
+        lay.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(lay)
+
+    def showEvent(self, event) -> None:
+        self.plugin.get_robis_win()
+        super().showEvent(event)
+
+    def _show(self):
+        self.plugin.get_robis_win()._show()
 
 
 class ROBisPlugin(plugin.Plugin):
@@ -16,24 +34,115 @@ class ROBisPlugin(plugin.Plugin):
     version = "1.3.1"
 
     def __init__(self, mw):
+        started = time.perf_counter()
         super().__init__(mw)
-        self.robis_win = robiswin.ROBisWindow(self.mw, self)
-        self.robis_login_win = robiswebconfig.ROBisLoginWindow(self.mw)
-        self.register_mw_tab(self.robis_win, qta.icon("mdi6.web"))
+        self.auth = None
+        self.client = None
+        self.robis_win = None
+        self.robis_login_win = None
+        self.tracker = None
+        self.synced_db = None
+        self.event_timer = None
+        self.robis_tab = ROBisTab(self)
+        self.register_mw_tab(self.robis_tab, qta.icon("mdi6.web"))
         self.register_ww_menu("Přihlášení do ROBisu")
+        self.startup_ms = (time.perf_counter() - started) * 1000
+
+    def get_auth(self):
+        if not self.auth:
+            import robisauth
+
+            self.auth = robisauth.ROBisAuth(self.mw)
+            self.auth.expiring.connect(self.login_expiring)
+            self.auth.login_required.connect(self.login_required)
+        return self.auth
+
+    def get_client(self):
+        if not self.client:
+            import robisnet
+
+            self.client = robisnet.ROBisClient(self.mw, self.get_auth())
+        return self.client
+
+    def get_tracker(self):
+        if not self.tracker:
+            import robistrack
+
+            self.tracker = robistrack.ROBisChangeTracker(self.mw)
+            self.tracker.changed.connect(self.track_changes)
+            self.tracker.install()
+        return self.tracker
+
+    def get_robis_win(self):
+        if not self.robis_win:
+            import robiswin
+
+            self.robis_win = robiswin.ROBisWindow(self.mw, self)
+            self.robis_tab.layout().addWidget(self.robis_win)
+        return self.robis_win
+
+    def get_login_win(self):
+        if not self.robis_login_win:
+            import robiswebconfig
+
+            self.robis_login_win = robiswebconfig.ROBisLoginWindow(self.mw, self.get_client())
+        return self.robis_login_win
 
     def on_startup(self):
-        if cookie := api.get_config_value("robis-cookie"):
-            if time.time() > jwt.decode(cookie, options={"verify_signature": False})["exp"]:
-                if QMessageBox.information(self.mw, "Přihlášení do ROBisu",
-                                           "Přihlášení do ROBisu vypršelo. Chcete se přihlástit znovu?") == QMessageBox.StandardButton.Ok:
-                    self.robis_login_win.show()
+        # Neither is needed to bring ARDFEvent up, they run once the event loop is idle.
+        QTimer.singleShot(0, self.check_login)
+        QTimer.singleShot(0, self.resume_sync)
+
+    def check_login(self):
+        # Loading the token arms the expiry timer, login_expiring fires right away for an expired one.
+        self.get_auth().token
+
+    def resume_sync(self):
+        # Results left in the outbox by the last session are sent by the window, so an event linked to ROBis
+        # gets it right away. Edits are tracked from now on, whichever event is open.
+        self.get_tracker()
+        if not self.event_timer:
+            # ARDFEvent does not announce opening another event, the open one is checked now and then.
+            self.event_timer = QTimer(self.mw)
+            self.event_timer.setInterval(EVENT_CHECK_MS)
+            self.event_timer.timeout.connect(self.resume_sync)
+            self.event_timer.start()
+
+        db = getattr(self.mw, "db", None)
+        if self.robis_win or db is None or db is self.synced_db:
+            return
+        self.synced_db = db
+        if api.get_basic_info(db)["robis_api"]:
+            self.get_robis_win()._drain_outbox()
+            self.event_timer.stop()
+
+    def track_changes(self, bind, punches: set, runners: set, categories: set):
+        # The window handles the changes itself once it exists, until then the first change builds it.
+        if self.robis_win or bind is not getattr(self.mw, "db", None) or not api.get_basic_info(bind)["robis_api"]:
+            return
+        self.get_robis_win()._mark_dirty(bind, punches, runners, categories)
+
+    def login_expiring(self, remaining: int):
+        if remaining <= 0:
+            text = "Přihlášení do ROBisu vypršelo. Chcete se přihlástit znovu?"
+        else:
+            text = f"Přihlášení do ROBisu vyprší za {remaining // 60} min. Chcete se přihlásit znovu?"
+        if QMessageBox.information(self.mw, "Přihlášení do ROBisu", text) == QMessageBox.StandardButton.Ok:
+            self.get_login_win().show()
+
+    def login_required(self):
+        login_win = self.get_login_win()
+        login_win.error_lbl.setText("ROBis odmítl přihlášení, přihlaste se znovu.")
+        login_win.show()
 
     def on_readout(self, sinum: int):
-        self.robis_win._send_online_readout(self.mw.db, sinum)
+        # Without an API key there is nothing to send, the window stays unbuilt.
+        if not self.robis_win and not api.get_basic_info(self.mw.db)["robis_api"]:
+            return
+        self.get_robis_win()._send_online_readout(self.mw.db, sinum)
 
     def on_menu(self):
-        self.robis_login_win.show()
+        self.get_login_win().show()
 
 
 fileplugin = ROBisPlugin
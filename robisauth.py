@@ -0,0 +1,88 @@
+import os
+import time
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+import api
+
+# How long before the token expires the user is asked to log in again.
+AUTH_WARN_BEFORE_S = int(os.getenv("ARDF_ROBIS_AUTH_WARN_S", "1800"))
+# QTimer intervals are 32-bit milliseconds.
+TIMER_MAX_MS = 2 ** 31 - 1
+
+
+def token_expiry(token: str) -> float | None:
+    import jwt
+
+    try:
+        return float(jwt.decode(token, options={"verify_signature": False})["exp"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError):
+        return None
+
+
+class ROBisAuth(QObject):
+    expiring = Signal(int)
+    login_required = Signal()
+    changed = Signal()
+    cancelled = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loaded = False
+        self._token = None
+        self.expires = None
+        self.waiting = False
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.check)
+
+    @property
+    def token(self) -> str | None:
+        # The config is read once, every request after that uses the in-memory copy.
+        if not self.loaded:
+            self.loaded = True
+            self.set_token(api.get_config_value("robis-cookie"), store=False)
+        return self._token
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.time() >= self.expires
+
+    def remaining(self) -> int:
+        return int(self.expires - time.time()) if self.expires is not None else 0
+
+    def set_token(self, token: str | None, store: bool = True):
+        self.loaded = True
+        self._token = token
+        self.expires = token_expiry(token) if token else None
+        if store:
+            api.set_config_value("robis-cookie", token)
+
+        self.timer.stop()
+        if self.expires is not None:
+            self.timer.start(max(0, min(TIMER_MAX_MS, int((self.expires - AUTH_WARN_BEFORE_S - time.time()) * 1000))))
+
+        if store and token:
+            self.waiting = False
+            self.changed.emit()
+
+    def check(self):
+        if self.expires is None:
+            return
+        if time.time() < self.expires - AUTH_WARN_BEFORE_S:
+            self.timer.start(min(TIMER_MAX_MS, int((self.expires - AUTH_WARN_BEFORE_S - time.time()) * 1000)))
+            return
+        self.expiring.emit(self.remaining())
+
+    def request_login(self):
+        # A request was refused with 401, ask once and let the caller wait for changed or cancelled.
+        if self.waiting:
+            return
+        self.waiting = True
+        self.login_required.emit()
+
+    def login_closed(self):
+        if self.waiting:
+            self.waiting = False
+            self.cancelled.emit()
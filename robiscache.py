@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import time
+
+from PySide6.QtCore import QStandardPaths
+
+CACHE_MAX_BYTES = int(os.getenv("ARDF_ROBIS_CACHE_MAX", str(32 * 1024 * 1024)))
+
+
+def cache_path() -> str:
+    directory = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+    if not directory:
+        return ":memory:"
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, "robis-cache.sqlite")
+
+
+class ROBisCacheEntry:
+    __slots__ = ("etag", "last_modified", "body", "fetched")
+
+    def __init__(self, etag: str | None, last_modified: str | None, body: bytes, fetched: float):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.fetched = fetched
+
+
+class ROBisCache:
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory = {}
+        # Access times of cache hits, written with the next store instead of on every read.
+        self.accessed = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> ROBisCacheEntry | None:
+        entry = self.memory.get(key)
+        if entry is None:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, body, fetched FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            entry = self.memory[key] = ROBisCacheEntry(*row)
+        self.accessed[key] = time.time()
+        return entry
+
+    def write_accessed(self):
+        if self.accessed:
+            self.conn.executemany("UPDATE cache SET accessed = ? WHERE key = ?",
+                                  [(accessed, key) for key, accessed in self.accessed.items()])
+            self.accessed.clear()
+
+    def store(self, key: str, etag: str | None, last_modified: str | None, body: bytes):
+        now = time.time()
+        self.memory[key] = ROBisCacheEntry(etag, last_modified, body, now)
+        self.accessed.pop(key, None)
+        self.write_accessed()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cache (key, etag, last_modified, body, fetched, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, etag, last_modified, body, now, now),
+        )
+        self.conn.commit()
+        self.evict()
+
+    def revalidated(self, key: str):
+        now = time.time()
+        if key in self.memory:
+            self.memory[key].fetched = now
+        self.accessed.pop(key, None)
+        self.write_accessed()
+        self.conn.execute("UPDATE cache SET fetched = ?, accessed = ? WHERE key = ?", (now, now, key))
+        self.conn.commit()
+
+    def evict(self):
+        self.write_accessed()
+        total = 0
+        evicted = []
+        for key, size in self.conn.execute("SELECT key, LENGTH(body) FROM cache ORDER BY accessed DESC"):
+            total += size
+            if total > self.max_bytes:
+                evicted.append(key)
+        if evicted:
+            self.conn.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in evicted])
+            self.conn.commit()
+            for key in evicted:
+                self.memory.pop(key, None)
+
+    def clear(self):
+        self.memory.clear()
+        self.accessed.clear()
+        self.conn.execute("DELETE FROM cache")
+        self.conn.commit()
@@ -0,0 +1,191 @@
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from PySide6.QtWidgets import QCheckBox, QFileDialog, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, \
+    QTextBrowser, QVBoxLayout, QWidget
+
+from robisnet import ROBisStats
+
+METRICS_COLUMNS = ["name", "count", "errors", "avg_ms", "max_ms", "total_ms", "bytes_sent", "bytes_received"]
+METRICS_HEADERS = ["Operace", "Počet", "Chyby", "Průměr [ms]", "Max [ms]", "Celkem [ms]", "Odesláno [B]",
+                   "Přijato [B]"]
+
+
+class ROBisSpan:
+    __slots__ = ("sent", "received", "error")
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.error = False
+
+
+class ROBisMetrics:
+    def __init__(self):
+        # Readout and import threads record timings too.
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def record(self, name: str, elapsed_ms: float, sent: int = 0, received: int = 0, error: bool = False):
+        with self.lock:
+            self.timings.setdefault(name, ROBisStats()).record(elapsed_ms, sent, received, error)
+
+    @contextmanager
+    def timed(self, name: str):
+        span = ROBisSpan()
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception:
+            span.error = True
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000, span.sent, span.received, span.error)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: int):
+        with self.lock:
+            _, peak = self.gauges.get(name, (0, 0))
+            self.gauges[name] = (value, max(peak, value))
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.started = time.time()
+
+    def snapshot(self, network: dict | None = None) -> dict:
+        with self.lock:
+            timings = [(name, stats) for name, stats in self.timings.items()]
+            timings += [(f"HTTP {name}", stats) for name, stats in (network or {}).items()]
+            return {
+                "started": self.started,
+                "taken": time.time(),
+                "timings": [
+                    {
+                        "name": name,
+                        "count": stats.count,
+                        "errors": stats.errors,
+                        "avg_ms": round(stats.avg_ms, 2),
+                        "max_ms": round(stats.max_ms, 2),
+                        "total_ms": round(stats.total_ms, 2),
+                        "bytes_sent": stats.bytes_sent,
+                        "bytes_received": stats.bytes_received,
+                    }
+                    for name, stats in sorted(timings, key=lambda timing: timing[0])
+                ],
+                "counters": dict(sorted(self.counters.items())),
+                "gauges": {name: {"last": last, "max": peak} for name, (last, peak) in sorted(self.gauges.items())},
+            }
+
+    def export_json(self, path: str, network: dict | None = None):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(network), f, ensure_ascii=False, indent=2)
+
+    def export_csv(self, path: str, network: dict | None = None):
+        snapshot = self.snapshot(network)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", *METRICS_COLUMNS])
+            for row in snapshot["timings"]:
+                writer.writerow(["timing", *(row[column] for column in METRICS_COLUMNS)])
+            for name, value in snapshot["counters"].items():
+                writer.writerow(["counter", name, value])
+            for name, gauge in snapshot["gauges"].items():
+                writer.writerow(["gauge", name, gauge["last"]])
+                writer.writerow(["gauge", f"{name} (max)", gauge["max"]])
+
+
+class ROBisMetricsWindow(QWidget):
+    def __init__(self, robiswin):
+        super().__init__()
+
+        self.robiswin = robiswin
+        self.metrics = robiswin.metrics
+
+        self.setWindowTitle("ROBis - statistiky")
+
+        lay = QVBoxLayout()
+        self.setLayout(lay)
+
+        self.table = QTableWidget(0, len(METRICS_HEADERS))
+        self.table.setHorizontalHeaderLabels(METRICS_HEADERS)
+        self.table.verticalHeader().hide()
+        lay.addWidget(self.table)
+
+        btns = QHBoxLayout()
+        lay.addLayout(btns)
+
+        self.refresh_btn = QPushButton("Obnovit")
+        self.refresh_btn.clicked.connect(self.refresh)
+        btns.addWidget(self.refresh_btn)
+
+        self.reset_btn = QPushButton("Vynulovat")
+        self.reset_btn.clicked.connect(self.reset)
+        btns.addWidget(self.reset_btn)
+
+        self.csv_btn = QPushButton("Export CSV")
+        self.csv_btn.clicked.connect(lambda: self.export("csv"))
+        btns.addWidget(self.csv_btn)
+
+        self.json_btn = QPushButton("Export JSON")
+        self.json_btn.clicked.connect(lambda: self.export("json"))
+        btns.addWidget(self.json_btn)
+
+        self.profile_chk = QCheckBox("Profilovat příští odečet (cProfile)")
+        self.profile_chk.toggled.connect(self.robiswin.readout_worker.set_profile_next)
+        lay.addWidget(self.profile_chk)
+
+        self.profile_out = QTextBrowser()
+        lay.addWidget(self.profile_out)
+
+        self.robiswin.readout_worker.profiled.connect(self.profiled)
+
+    def show(self):
+        self.refresh()
+        super().show()
+
+    def network(self) -> dict:
+        return self.robiswin.client.stats
+
+    def refresh(self):
+        snapshot = self.metrics.snapshot(self.network())
+        rows = [[row[column] for column in METRICS_COLUMNS] for row in snapshot["timings"]]
+        rows += [[name, value] for name, value in snapshot["counters"].items()]
+        for name, gauge in snapshot["gauges"].items():
+            rows += [[name, gauge["last"]], [f"{name} (max)", gauge["max"]]]
+
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                self.table.setItem(i, j, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+
+    def reset(self):
+        self.metrics.reset()
+        self.network().clear()
+        self.refresh()
+
+    def export(self, fmt: str):
+        path, _ = QFileDialog.getSaveFileName(self, "Export statistik", f"robis-stats.{fmt}", f"{fmt.upper()} (*.{fmt})")
+        if not path:
+            return
+        if fmt == "csv":
+            self.metrics.export_csv(path, self.network())
+        else:
+            self.metrics.export_json(path, self.network())
+
+    def profiled(self, report: str):
+        self.profile_chk.setChecked(False)
+        self.profile_out.setPlainText(report)
+        self.refresh()
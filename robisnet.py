@@ -0,0 +1,313 @@
+import gzip
+import hashlib
+import json as jsonlib
+import os
+import time
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+from PySide6.QtCore import QByteArray, QObject, QTimer, QUrl, Signal
+from PySide6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
+
+from robisauth import ROBisAuth
+from robiscache import ROBisCache, cache_path
+
+ROBIS_URL = os.getenv("ARDF_ROBIS_URL", "https://rob-is.cz")
+TIMEOUT_MS = int(os.getenv("ARDF_ROBIS_TIMEOUT_MS", "30000"))
+# Bodies at least this large are sent gzip-compressed, 0 disables compression.
+GZIP_MIN_BYTES = int(os.getenv("ARDF_ROBIS_GZIP_MIN", "0"))
+
+
+def endpoint(method: str, path: str) -> str:
+    url = urlsplit(path)
+    name = parse_qs(url.query).get("name")
+    return f"{method} {url.path}{f"?name={name[0]}" if name else ""}"
+
+
+class ROBisStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def record(self, elapsed_ms: float, sent: int, received: int, error: bool):
+        self.count += 1
+        self.errors += error
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+
+class ROBisResponse:
+    def __init__(self, status_code: int | None, content: bytes, error: str | None, cookies: dict,
+                 headers: dict | None = None, from_cache: bool = False):
+        self.status_code = status_code
+        self.content = content
+        self.error = error
+        self.cookies = cookies
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+class ROBisCall(QObject):
+    finished = Signal(object)
+
+    def __init__(self, client, reply: QNetworkReply, endpoint: str, sent: int, cache_key: str | None = None,
+                 resend=None):
+        super().__init__()
+        self.client = client
+        self.reply = reply
+        self.endpoint = endpoint
+        self.sent = sent
+        self.cache_key = cache_key
+        self.resend = resend
+        self.retry = None
+        self.started = time.perf_counter()
+        self.done = False
+        self.cancelled = False
+        reply.finished.connect(self._on_finished)
+
+    def cancel(self):
+        self.cancelled = True
+        if self.retry:
+            self.retry.cancel()
+        elif not self.done:
+            self.reply.abort()
+
+    def resent(self):
+        self.client.calls.add(self)
+        self.retry = self.resend()
+        self.retry.finished.connect(self._on_resent)
+
+    def _on_resent(self, response):
+        self.client.calls.discard(self)
+        if not self.cancelled:
+            self.finished.emit(response)
+
+    def _on_finished(self):
+        self.done = True
+        self.client.calls.discard(self)
+
+        reply = self.reply
+        status = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        error = None if reply.error() == QNetworkReply.NetworkError.NoError else reply.error().name
+        cookies = {
+            cookie.name().data().decode(): cookie.value().data().decode()
+            for cookie in reply.header(QNetworkRequest.KnownHeaders.SetCookieHeader) or []
+        }
+        headers = {bytes(name).decode().lower(): bytes(value).decode() for name, value in reply.rawHeaderPairs()}
+        response = ROBisResponse(status, reply.readAll().data(), error, cookies, headers)
+        reply.deleteLater()
+
+        self.client.stats.setdefault(self.endpoint, ROBisStats()).record(
+            (time.perf_counter() - self.started) * 1000, self.sent, len(response.content), error is not None
+        )
+
+        if self.cache_key:
+            response = self.client.cached_response(self.cache_key, response)
+
+        if self.cancelled:
+            return
+        if response.status_code == 401 and self.resend:
+            # Held until the user logs in again, then sent once more with the new token.
+            self.client.hold_unauthorized(self, response)
+            return
+        self.finished.emit(response)
+
+
+class ROBisCachedCall(QObject):
+    finished = Signal(object)
+
+    def __init__(self, client, response: ROBisResponse):
+        super().__init__()
+        self.client = client
+        self.response = response
+        self.done = False
+        self.cancelled = False
+        QTimer.singleShot(0, self._on_finished)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _on_finished(self):
+        self.done = True
+        self.client.calls.discard(self)
+        if not self.cancelled:
+            self.finished.emit(self.response)
+
+
+class ROBisGroup(QObject):
+    finished = Signal(list)
+
+    def __init__(self, client, calls: list[ROBisCall]):
+        super().__init__()
+        self.client = client
+        self.calls = calls
+        self.responses = [None] * len(calls)
+        self.pending = len(calls)
+        for i, call in enumerate(calls):
+            call.finished.connect(partial(self._on_finished, i))
+
+    def cancel(self):
+        self.client.calls.discard(self)
+        for call in self.calls:
+            call.cancel()
+
+    def _on_finished(self, i: int, response: ROBisResponse):
+        self.responses[i] = response
+        self.pending -= 1
+        if not self.pending:
+            self.client.calls.discard(self)
+            self.finished.emit(self.responses)
+
+
+class ROBisClient(QObject):
+    def __init__(self, parent=None, auth: ROBisAuth | None = None):
+        super().__init__(parent)
+        # A single manager keeps connections to ROBis alive and reuses them. It also sends
+        # Accept-Encoding: gzip, deflate and transparently decompresses the responses.
+        self.nam = QNetworkAccessManager(self)
+        self.calls = set()
+        self.stats = {}
+        self.cache = None
+        self.unauthorized = []
+
+        self.auth = auth or ROBisAuth(self)
+        self.auth.changed.connect(self.resend_unauthorized)
+        self.auth.cancelled.connect(self.fail_unauthorized)
+
+    def hold_unauthorized(self, call: ROBisCall, response: ROBisResponse):
+        self.unauthorized.append((call, response))
+        self.auth.request_login()
+
+    def resend_unauthorized(self):
+        held, self.unauthorized = self.unauthorized, []
+        for call, _ in held:
+            if not call.cancelled:
+                call.resent()
+
+    def fail_unauthorized(self):
+        held, self.unauthorized = self.unauthorized, []
+        for call, response in held:
+            if not call.cancelled:
+                call.finished.emit(response)
+
+    def get_cache(self) -> ROBisCache:
+        if not self.cache:
+            self.cache = ROBisCache(cache_path())
+        return self.cache
+
+    def cached_response(self, key: str, response: ROBisResponse) -> ROBisResponse:
+        cache = self.get_cache()
+        if response.status_code == 304:
+            entry = cache.get(key)
+            if entry:
+                cache.revalidated(key)
+                return ROBisResponse(200, entry.body, None, {}, response.headers, from_cache=True)
+        elif response.status_code == 200:
+            cache.store(key, response.headers.get("etag"), response.headers.get("last-modified"), response.content)
+        return response
+
+    def request(self, method: str, path: str, data: bytes | None = None, json=None, headers: dict | None = None,
+                cookies: dict | None = None, apikey: str | None = None, auth: bool = False,
+                timeout: int = TIMEOUT_MS, cache_ttl: int | None = None, refresh: bool = False, retry: bool = True):
+        # cache_ttl=None bypasses the cache, 0 always revalidates with a conditional GET,
+        # a positive value serves the cached body for that many seconds without asking ROBis.
+        resend = None
+        if auth and retry:
+            resend = partial(self.request, method, path, data=data, json=json, headers=headers, cookies=cookies,
+                             apikey=apikey, auth=auth, timeout=timeout, cache_ttl=cache_ttl, refresh=True, retry=False)
+        token = self.auth.token if auth else None
+
+        cache_key = None
+        entry = None
+        if method == "GET" and cache_ttl is not None:
+            cache_key = hashlib.sha256(
+                "\n".join([path, apikey or "", token or "",
+                           jsonlib.dumps(headers or {}, sort_keys=True)]).encode("utf-8")
+            ).hexdigest()
+            entry = self.get_cache().get(cache_key)
+            if entry and not refresh and time.time() - entry.fetched < cache_ttl:
+                call = ROBisCachedCall(self, ROBisResponse(200, entry.body, None, {}, from_cache=True))
+                self.calls.add(call)
+                return call
+
+        request = QNetworkRequest(QUrl(f"{ROBIS_URL}{path}"))
+        request.setTransferTimeout(timeout)
+
+        if entry and not refresh:
+            if entry.etag:
+                request.setRawHeader(QByteArray(b"If-None-Match"), QByteArray(entry.etag.encode("utf-8")))
+            if entry.last_modified:
+                request.setRawHeader(QByteArray(b"If-Modified-Since"), QByteArray(entry.last_modified.encode("utf-8")))
+
+        if json is not None:
+            data = jsonlib.dumps(json).encode("utf-8")
+            request.setHeader(QNetworkRequest.KnownHeaders.ContentTypeHeader, "application/json")
+        if data and GZIP_MIN_BYTES and len(data) >= GZIP_MIN_BYTES:
+            data = gzip.compress(data, compresslevel=6)
+            request.setRawHeader(QByteArray(b"Content-Encoding"), QByteArray(b"gzip"))
+        for name, value in (headers or {}).items():
+            request.setRawHeader(QByteArray(name.encode("utf-8")), QByteArray(value.encode("utf-8")))
+        if apikey is not None:
+            request.setRawHeader(QByteArray(b"Race-Api-Key"), QByteArray(apikey.encode("utf-8")))
+        if auth:
+            cookies = {"authToken": token or "", **(cookies or {})}
+        if cookies:
+            request.setRawHeader(
+                QByteArray(b"Cookie"),
+                QByteArray("; ".join(f"{name}={value}" for name, value in cookies.items()).encode("utf-8")),
+            )
+
+        if method == "GET":
+            reply = self.nam.get(request)
+        elif method == "POST":
+            reply = self.nam.post(request, QByteArray(data or b""))
+        elif method == "PUT":
+            reply = self.nam.put(request, QByteArray(data or b""))
+        else:
+            reply = self.nam.sendCustomRequest(request, QByteArray(method.encode("utf-8")), QByteArray(data or b""))
+
+        call = ROBisCall(self, reply, endpoint(method, path), len(data or b""), cache_key, resend)
+        self.calls.add(call)
+        return call
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> ROBisCall:
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> ROBisCall:
+        return self.request("PUT", path, **kwargs)
+
+    def gather(self, calls: list[ROBisCall]) -> ROBisGroup:
+        group = ROBisGroup(self, calls)
+        self.calls.add(group)
+        return group
+
+    def cancel_all(self):
+        for call in list(self.calls):
+            call.cancel()
+        for call, _ in self.unauthorized:
+            call.cancel()
+        self.unauthorized.clear()
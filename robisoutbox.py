@@ -0,0 +1,111 @@
+import sqlite3
+import time
+
+BACKOFF_MIN = 5
+BACKOFF_MAX = 300
+
+
+def sidecar_path(db) -> str:
+    database = getattr(getattr(db, "url", None), "database", None)
+    if not database or database == ":memory:":
+        return ":memory:"
+    return f"{database}.robis.sqlite"
+
+
+class ROBisOutbox:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                apikey TEXT NOT NULL,
+                key TEXT NOT NULL,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_try REAL NOT NULL,
+                UNIQUE (kind, apikey, key)
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS uploaded (
+                kind TEXT NOT NULL,
+                apikey TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (kind, apikey)
+            )"""
+        )
+        self.conn.commit()
+
+    def put(self, kind: str, apikey: str, key: str, method: str, url: str, body: bytes):
+        self.put_many(kind, apikey, method, url, [(key, body)])
+
+    def put_many(self, kind: str, apikey: str, method: str, url: str, items):
+        # Replacing the row drops the superseded payload and gives the new one a fresh id,
+        # so acknowledging an older in-flight copy never deletes it.
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO outbox (kind, apikey, key, method, url, body, next_try) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(kind, apikey, key, method, url, body, now) for key, body in items],
+        )
+        self.conn.commit()
+
+    def bodies(self, kind: str, apikey: str) -> dict[str, bytes]:
+        return dict(self.conn.execute("SELECT key, body FROM outbox WHERE kind = ? AND apikey = ?", (kind, apikey)))
+
+    def pending(self, kind: str, apikey: str, key: str = "") -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM outbox WHERE kind = ? AND apikey = ? AND key = ?", (kind, apikey, key)
+        ).fetchone() is not None
+
+    def uploaded_digest(self, kind: str, apikey: str) -> str | None:
+        row = self.conn.execute("SELECT digest FROM uploaded WHERE kind = ? AND apikey = ?", (kind, apikey)).fetchone()
+        return row[0] if row else None
+
+    def set_uploaded(self, kind: str, apikey: str, digest: str):
+        self.conn.execute("INSERT OR REPLACE INTO uploaded (kind, apikey, digest) VALUES (?, ?, ?)", (kind, apikey, digest))
+        self.conn.commit()
+
+    def due(self, kind: str | None = None, limit: int = -1, with_body: bool = True) -> list[tuple]:
+        # Large startlist/results payloads are only read when they are actually sent.
+        query = f"SELECT id, kind, apikey, key, method, url, {"body" if with_body else "NULL"} FROM outbox WHERE next_try <= ?"
+        params = [time.time()]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        else:
+            query += " AND kind != 'online'"
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(query, params).fetchall()
+
+    def payload(self, id: int) -> bytes | None:
+        row = self.conn.execute("SELECT body FROM outbox WHERE id = ?", (id,)).fetchone()
+        return row[0] if row else None
+
+    def done(self, ids):
+        self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+        self.conn.commit()
+
+    def failed(self, ids):
+        now = time.time()
+        self.conn.executemany(
+            f"UPDATE outbox SET attempts = attempts + 1, next_try = ? + MIN({BACKOFF_MAX}, {BACKOFF_MIN} * (1 << MIN(attempts, 16))) WHERE id = ?",
+            [(now, i) for i in ids],
+        )
+        self.conn.commit()
+
+    def wake(self):
+        self.conn.execute("UPDATE outbox SET next_try = ? WHERE next_try > ?", (time.time(), time.time()))
+        self.conn.commit()
+
+    def count(self, kind: str | None = None) -> int:
+        if kind is None:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
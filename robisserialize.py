@@ -0,0 +1,132 @@
+import json
+from datetime import timedelta
+
+from sqlalchemy import Select
+from sqlalchemy.orm import Session, selectinload
+
+import results
+from models import Category, Control
+
+
+class ROBisPunch:
+    __slots__ = ("code", "control_type", "punch_status", "split_time")
+
+    def __init__(self, code: str, control_type: str, punch_status: str, split_time: str):
+        self.code = code
+        self.control_type = control_type
+        self.punch_status = punch_status
+        self.split_time = split_time
+
+    def as_dict(self) -> dict:
+        return {
+            "code": self.code,
+            "control_type": self.control_type,
+            "punch_status": self.punch_status,
+            "split_time": self.split_time,
+        }
+
+
+class ROBisResult:
+    __slots__ = ("competitor_index", "si_number", "last_name", "first_name", "category_name", "run_time",
+                 "punch_count", "result_status", "punches", "_json")
+
+    def __init__(self, category_name: str, result):
+        punches = []
+        last = result.start
+        for punch in result.order:
+            punches.append(
+                ROBisPunch(
+                    punch[0],
+                    "CONTROL" if punch[0] != "M" else "BEACON",
+                    punch[2],
+                    results.format_delta(punch[1] - last),
+                )
+            )
+            last = punch[1]
+        if result.finish:
+            punches.append(ROBisPunch("F", "FINISH", "OK", results.format_delta(result.finish - last)))
+
+        self.competitor_index = result.reg
+        self.si_number = result.si
+        self.last_name, _, self.first_name = result.name.partition(", ")
+        self.category_name = category_name
+        self.run_time = results.format_delta(timedelta(seconds=result.time))
+        self.punch_count = result.tx
+        self.result_status = result.status
+        self.punches = punches
+        self._json = None
+
+    def as_dict(self) -> dict:
+        return {
+            "competitor_index": self.competitor_index,
+            "si_number": self.si_number,
+            "last_name": self.last_name,
+            "first_name": self.first_name,
+            "category_name": self.category_name,
+            "result": {
+                "run_time": self.run_time,
+                "punch_count": self.punch_count,
+                "result_status": self.result_status,
+                "punches": [punch.as_dict() for punch in self.punches],
+            },
+        }
+
+    @property
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = json.dumps(self.as_dict(), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return self._json
+
+
+class ROBisSerializer:
+    def __init__(self):
+        self.cache = {}
+
+    def serialize(self, category_name: str, result) -> ROBisResult:
+        key = (category_name, result.reg)
+        # Everything the ROBis record is derived from; splits are recomputed only when it changes.
+        fingerprint = (result.si, result.name, result.start, result.finish, result.time, result.tx, result.status,
+                       result.order)
+        cached = self.cache.get(key)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        record = ROBisResult(category_name, result)
+        self.cache[key] = (fingerprint, record)
+        return record
+
+    def clear(self):
+        self.cache.clear()
+
+
+def race_payload(categories, controls) -> dict:
+    cats = []
+    for dbcat in categories:
+        cats.append(
+            {
+                "category_name": dbcat.name,
+                "category_control_points": [
+                    {"si_code": control.code, "control_type": "BEACON" if control.mandatory else "CONTROL"}
+                    for control in dbcat.controls
+                ],
+            }
+        )
+
+    # Controls sharing an SI code become one alias, named in the order they were defined.
+    aliases = {}
+    for cont in controls:
+        alias = aliases.get(cont.code)
+        if alias:
+            alias["alias_name"] += f"/{cont.name}"
+        else:
+            aliases[cont.code] = {"alias_si_code": cont.code, "alias_name": cont.name}
+
+    return {"categories": cats, "aliases": list(aliases.values())}
+
+
+def export_race(db) -> dict:
+    with Session(db) as sess:
+        return race_payload(
+            sess.scalars(Select(Category).options(selectinload(Category.controls))).all(),
+            sess.scalars(Select(Control)).all(),
+        )
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+
+from PySide6.QtCore import QStandardPaths
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_KEEP = 5
+
+
+def snapshot_path() -> str:
+    directory = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+    if not directory:
+        return ":memory:"
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, "robis-snapshots.sqlite")
+
+
+class ROBisSnapshot:
+    __slots__ = ("id", "apikey", "fetched", "event", "race", "digest")
+
+    def __init__(self, id: int, apikey: str, fetched: float, event: bytes, race: bytes, digest: str):
+        self.id = id
+        self.apikey = apikey
+        self.fetched = fetched
+        self.event = event
+        self.race = race
+        self.digest = digest
+
+
+class ROBisSnapshots:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS snapshot (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                apikey TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                fetched REAL NOT NULL,
+                event BLOB NOT NULL,
+                race BLOB NOT NULL,
+                digest TEXT NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS snapshot_apikey ON snapshot (apikey, id)")
+        self.conn.commit()
+
+    def latest(self, apikey: str) -> ROBisSnapshot | None:
+        row = self.conn.execute(
+            "SELECT id, apikey, fetched, event, race, digest FROM snapshot WHERE apikey = ? AND version = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (apikey, SNAPSHOT_VERSION),
+        ).fetchone()
+        if not row:
+            return None
+        id, apikey, fetched, event, race, digest = row
+        return ROBisSnapshot(id, apikey, fetched, gzip.decompress(event), gzip.decompress(race), digest)
+
+    def store(self, apikey: str, event: bytes, race: bytes) -> bool:
+        digest = hashlib.sha256(event + b"\0" + race).hexdigest()
+        row = self.conn.execute(
+            "SELECT digest FROM snapshot WHERE apikey = ? ORDER BY id DESC LIMIT 1", (apikey,)
+        ).fetchone()
+        if row and row[0] == digest:
+            self.conn.execute(
+                "UPDATE snapshot SET fetched = ? WHERE id = (SELECT MAX(id) FROM snapshot WHERE apikey = ?)",
+                (time.time(), apikey),
+            )
+            self.conn.commit()
+            return False
+
+        self.conn.execute(
+            "INSERT INTO snapshot (apikey, version, fetched, event, race, digest) VALUES (?, ?, ?, ?, ?, ?)",
+            (apikey, SNAPSHOT_VERSION, time.time(), gzip.compress(event), gzip.compress(race), digest),
+        )
+        self.conn.execute(
+            "DELETE FROM snapshot WHERE apikey = ? AND id NOT IN "
+            "(SELECT id FROM snapshot WHERE apikey = ? ORDER BY id DESC LIMIT ?)",
+            (apikey, apikey, SNAPSHOT_KEEP),
+        )
+        self.conn.commit()
+        return True
+
+    def close(self):
+        self.conn.close()
+
+
+def race_changes(old: dict, new: dict) -> dict:
+    old_competitors = {str(c["competitor_index"]): c for c in old.get("competitors", [])}
+    new_competitors = {str(c["competitor_index"]): c for c in new.get("competitors", [])}
+    return {
+        "added": [index for index in new_competitors if index not in old_competitors],
+        "removed": [index for index in old_competitors if index not in new_competitors],
+        "changed": [index for index, c in new_competitors.items()
+                    if index in old_competitors and old_competitors[index] != c],
+        "categories": {c["category_name"] for c in old.get("categories", [])}
+                      != {c["category_name"] for c in new.get("categories", [])},
+    }
@@ -0,0 +1,76 @@
+from PySide6.QtCore import QObject, Signal
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Category, Punch, Runner
+
+# Runner columns an online result is derived from.
+RUNNER_FIELDS = ("name", "si", "reg", "manual_dns", "category_id")
+# Of those, the ones that give the runner a result of its own, like a readout does.
+RESULT_FIELDS = ("manual_dns",)
+
+
+class ROBisChangeTracker(QObject):
+    # bind, SI numbers with a new result (new or edited punches, DNS), SI numbers of otherwise edited runners,
+    # category ids
+    changed = Signal(object, set, set, set)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.installed = False
+
+    def install(self):
+        if self.installed:
+            return
+        event.listen(Session, "after_flush", self.after_flush)
+        event.listen(Session, "after_commit", self.after_commit)
+        event.listen(Session, "after_rollback", self.after_rollback)
+        self.installed = True
+
+    def after_flush(self, session, flush_context):
+        # Collected per flush, reported only once the transaction commits.
+        punches, runners, categories = session.info.setdefault("robis_dirty", (set(), set(), set()))
+
+        for obj in session.new:
+            if isinstance(obj, Punch):
+                punches.add(obj.si)
+
+        for obj in session.dirty:
+            if isinstance(obj, Runner):
+                state = inspect(obj)
+                changed = [field for field in RUNNER_FIELDS if field in state.attrs and state.attrs[field].history.has_changes()]
+                if not changed:
+                    continue
+                if any(field in RESULT_FIELDS for field in changed):
+                    punches.add(obj.si)
+                else:
+                    runners.add(obj.si)
+                if "category_id" in changed:
+                    categories.update(state.attrs.category_id.history.sum())
+                else:
+                    categories.add(obj.category_id)
+            elif isinstance(obj, Punch):
+                punches.add(obj.si)
+                punches.update(inspect(obj).attrs.si.history.deleted)
+            elif isinstance(obj, Category):
+                # Also covers edits of the control list, a collection change marks the category dirty.
+                # Runners joining or leaving show up on the runners themselves.
+                state = inspect(obj)
+                skip = {rel.key for rel in state.mapper.relationships if rel.mapper.class_ is Runner}
+                if any(attr.history.has_changes() for attr in state.attrs if attr.key not in skip):
+                    categories.add(obj.id)
+
+        for obj in session.deleted:
+            if isinstance(obj, Punch):
+                punches.add(obj.si)
+            elif isinstance(obj, Runner):
+                categories.add(obj.category_id)
+
+    def after_commit(self, session):
+        dirty = session.info.pop("robis_dirty", None)
+        if dirty and any(dirty):
+            punches, runners, categories = dirty
+            self.changed.emit(session.get_bind(), punches - {None}, runners - {None}, categories - {None})
+
+    def after_rollback(self, session):
+        session.info.pop("robis_dirty", None)
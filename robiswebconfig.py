@@ -1,21 +1,23 @@
-import os
 from datetime import datetime
+from functools import partial
 
-import requests
-from PySide6.QtCore import QThread, Signal, Qt
-from PySide6.QtWidgets import QFormLayout, QVBoxLayout, QWidget, QLabel, QPushButton, QLineEdit, QTreeWidget, \
-    QTreeWidgetItem, QProgressBar, QTreeWidgetItemIterator, QMessageBox
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, QSortFilterProxyModel, Qt, Signal
+from PySide6.QtWidgets import QFormLayout, QHBoxLayout, QVBoxLayout, QWidget, QLabel, QPushButton, QLineEdit, \
+    QTreeView, QProgressBar, QMessageBox, QSpinBox
 
 import api
+from robisnet import ROBisResponse
 
-ROBIS_URL = os.getenv("ARDF_ROBIS_URL", "https://rob-is.cz")
+BROWSER_CACHE_TTL = 600
 
 
 class ROBisLoginWindow(QWidget):
-    def __init__(self, mw):
+    def __init__(self, mw, client):
         super().__init__()
 
         self.mw = mw
+        self.client = client
+        self.call = None
 
         self.setWindowTitle("Přihlášení do ROBisu")
 
@@ -40,64 +42,143 @@ class ROBisLoginWindow(QWidget):
         lay.addRow(self.error_lbl)
 
     def login(self):
-        login = requests.post(f"{ROBIS_URL}/api/login/",
-                              json={"email": self.email_input.text(), "password": self.password_input.text()})
+        if self.call:
+            return
+        self.call = self.client.post("/api/login/",
+                                     json={"email": self.email_input.text(), "password": self.password_input.text()})
+        self.call.finished.connect(self.login_done)
+        self.loginbtn.setEnabled(False)
+
+    def login_done(self, login: ROBisResponse):
+        self.call = None
+        self.loginbtn.setEnabled(True)
+
         if login.status_code != 200:
-            self.error_lbl.setText(f"Chyba přihlášení: {login.json().get('error', str(login.status_code))}")
+            try:
+                error = login.json().get('error', str(login.status_code))
+            except ValueError:
+                error = str(login.status_code or login.error)
+            self.error_lbl.setText(f"Chyba přihlášení: {error}")
             return
         token = login.cookies.get("authToken")
         if not token:
             self.error_lbl.setText("Chyba přihlášení, zkontrolujte email a heslo.")
             return
-        api.set_config_value("robis-cookie", token)
+        self.client.auth.set_token(token)
         QMessageBox.information(self, "Přihlášení úspěšné", "Byli jste úspěšně přihlášeni do ROBisu.")
         self.close()
 
-
-class EventLoadThread(QThread):
-    data = Signal(list)
-
-    def run(self):
-        result = []
-
-        authToken = api.get_config_value("robis-cookie")
-
-        events = requests.get(f"{ROBIS_URL}/api/event/?year={datetime.now().year}&period=all",
-                              cookies={"authToken": authToken})
-
-        mx = len(events.json())
-
-        for i, event in enumerate(events.json()):
-            if event["event_closed"]:
-                continue
-
-            result.append({"name": event["event_name"],
-                           "date": datetime.strptime(event["event_date_start"], "%Y-%m-%d"),
-                           "id": event["id"]})
-        result.sort(key=lambda x: x["date"])
-        self.data.emit(result)
-
-
-class RaceLoadThread(QThread):
-    data = Signal(list, QTreeWidgetItem)
-
-    def __init__(self, item: QTreeWidgetItem):
-        super().__init__()
-        self.eid = item.data(0, Qt.UserRole)
-        self.item = item
-
-    def run(self):
-        event_admin = requests.get(f"{ROBIS_URL}/api/event/edit/?id={self.eid}",
-                                   cookies={"authToken": api.get_config_value("robis-cookie")})
-        if event_admin.status_code != 200:
-            self.data.emit([], self.item)
+    def closeEvent(self, event):
+        if self.call:
+            self.call.cancel()
+            self.call = None
+            self.loginbtn.setEnabled(True)
+        self.client.auth.login_closed()
+        super().closeEvent(event)
+
+
+class ROBisEventNode:
+    __slots__ = ("parent", "row", "name", "date", "id", "apikey", "children", "loading")
+
+    def __init__(self, parent, row: int, name: str, date: datetime | None, id=None, apikey: str | None = None):
+        self.parent = parent
+        self.row = row
+        self.name = name
+        self.date = date
+        self.id = id
+        self.apikey = apikey
+        # None until the races of an event are fetched.
+        self.children = None if id is not None else []
+        self.loading = False
+
+
+class ROBisEventModel(QAbstractItemModel):
+    fetch = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.events = []
+        self.by_id = {}
+
+    def set_events(self, events: list[dict]):
+        self.beginResetModel()
+        self.events = [ROBisEventNode(None, i, event["name"], event["date"], event["id"])
+                       for i, event in enumerate(events)]
+        self.by_id = {node.id: node for node in self.events}
+        self.endResetModel()
+
+    def set_races(self, event_id, races: list[dict]):
+        node = self.by_id.get(event_id)
+        if not node:
             return
-
-        ev_adm = event_admin.json()
-
-        self.data.emit(list(map(lambda x: {"name": x["race_name"],
-                                           "date": datetime.strptime(x["race_date"], "%Y-%m-%d"),
-                                           "apikey": x["race_api_key"]}, ev_adm["races"][1:])), self.item)
+        node.loading = False
+        if not races:
+            races = [{"name": "Nejste správce!", "date": None, "apikey": None}]
+        self.beginInsertRows(self.createIndex(node.row, 0, node), 0, len(races) - 1)
+        node.children = [ROBisEventNode(node, i, race["name"], race["date"], apikey=race["apikey"])
+                         for i, race in enumerate(races)]
+        self.endInsertRows()
+
+    def node(self, index: QModelIndex) -> ROBisEventNode | None:
+        return index.internalPointer() if index.isValid() else None
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        node = self.node(parent)
+        children = self.events if node is None else node.children or []
+        if not 0 <= row < len(children) or not 0 <= column < 2:
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        node = self.node(index)
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.createIndex(node.parent.row, 0, node.parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        node = self.node(parent)
+        if node is None:
+            return len(self.events)
+        return len(node.children or [])
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 2
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        node = self.node(parent)
+        return node is None or node.children is None or bool(node.children)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        node = self.node(parent)
+        return node is not None and node.children is None and not node.loading
+
+    def fetchMore(self, parent: QModelIndex):
+        node = self.node(parent)
+        node.loading = True
+        self.fetch.emit(node.id)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        node = self.node(index)
+        if node is None:
+            return None
+        if role == Qt.DisplayRole:
+            if index.column() == 1:
+                return node.name
+            if node.date:
+                return node.date.strftime("%d. %m. %Y" if node.parent is None else "%d. %m.")
+            return ""
+        if role == Qt.UserRole:
+            return node.id
+        if role == Qt.UserRole + 1:
+            return node.apikey
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ["Datum", "Závod"][section]
+        return None
 
 
 class ROBisWebConfigWindow(QWidget):
@@ -106,12 +187,11 @@ class ROBisWebConfigWindow(QWidget):
 
         self.mw = mw
         self.robiswin = robiswin
-        self.races = []
-        self.apikeys = {}
-        self.last_id = -1
-        self.current_race = -1
-        self.thr = None
-        self.rthr = None
+        self.client = robiswin.client
+        self.events_call = None
+        self.races_calls = {}
+        self.force_refresh = False
+        self.refreshed = set()
 
         self.setWindowTitle("Stažení z ROBisu")
 
@@ -119,78 +199,141 @@ class ROBisWebConfigWindow(QWidget):
         self.setLayout(lay)
 
         lay.addWidget(QLabel(
-            "Načítají se pouze letošní neuzavřené závody.\nEtapy načtete kliknutím na závod. Etapu otevřete dvojklikem."))
+            "Načítají se pouze neuzavřené závody vybraného roku.\nEtapy načtete kliknutím na závod. Etapu otevřete dvojklikem."))
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setTextVisible(False)
         lay.addWidget(self.progress_bar)
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["Datum", "Závod"])
+        filter_lay = QHBoxLayout()
+        lay.addLayout(filter_lay)
+
+        self.year_spin = QSpinBox()
+        self.year_spin.setRange(2000, 2100)
+        self.year_spin.setValue(datetime.now().year)
+        self.year_spin.valueChanged.connect(lambda: self.load_events())
+        filter_lay.addWidget(self.year_spin)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Hledat závod...")
+        self.search_edit.setClearButtonEnabled(True)
+        filter_lay.addWidget(self.search_edit)
+
+        self.refresh_btn = QPushButton("Obnovit seznam z ROBisu")
+        self.refresh_btn.clicked.connect(lambda: self.load_events(refresh=True))
+        lay.addWidget(self.refresh_btn)
+
+        self.model = ROBisEventModel(self)
+        self.model.fetch.connect(self.load_races)
+
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterKeyColumn(1)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.proxy.setAutoAcceptChildRows(True)
+        self.search_edit.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.proxy)
+        # Every row has the same height, the view then never measures rows one by one.
+        self.tree.setUniformRowHeights(True)
         lay.addWidget(self.tree)
 
+        self.tree.clicked.connect(self.expand_only)
+        self.tree.doubleClicked.connect(self.open_race)
+
+        self.stages_btn = QPushButton("Otevřít všechny etapy označené soutěže")
+        self.stages_btn.clicked.connect(self.open_stages)
+        lay.addWidget(self.stages_btn)
+
     def show(self):
         super().show()
+        self.load_events()
 
-        self.tree.clear()
+    def load_events(self, refresh: bool = False):
+        self.model.set_events([])
+        self.cancel_races()
 
-        if self.thr and self.thr.isRunning():
-            self.thr.terminate()
-            self.thr.wait()
+        if self.events_call:
+            self.events_call.cancel()
 
-        self.thr = EventLoadThread()
-        self.thr.data.connect(self.data_load)
-        self.thr.start()
-        self.progress_bar.setRange(0, 0)
-        self.tree.itemClicked.connect(self.load_races)
-        self.tree.itemDoubleClicked.connect(self.open_race)
-        self.tree.itemCollapsed.connect(lambda x: x.takeChildren())
+        # Only the "Obnovit" load bypasses the cache, for the races of that year too.
+        self.force_refresh = refresh
+        self.refreshed.clear()
 
-    def data_load(self, data):
-        for race in data:
-            item = QTreeWidgetItem([race["date"].strftime("%d. %m. %Y"), race["name"]])
-            item.setData(0, Qt.UserRole, race["id"])
-            self.tree.addTopLevelItem(item)
+        self.events_call = self.client.get(f"/api/event/?year={self.year_spin.value()}&period=all", auth=True,
+                                           cache_ttl=BROWSER_CACHE_TTL, refresh=refresh)
+        self.events_call.finished.connect(self.events_load)
+        self.set_busy()
 
-        self.progress_bar.setRange(0, 1)
-        self.progress_bar.setValue(1)
+    def events_load(self, events: ROBisResponse):
+        self.events_call = None
 
+        result = []
+
+        if events.status_code == 200:
+            result = [
+                {"name": event["event_name"],
+                 "date": datetime.strptime(event["event_date_start"], "%Y-%m-%d"),
+                 "id": event["id"]}
+                for event in events.json() if not event["event_closed"]
+            ]
+            result.sort(key=lambda x: x["date"])
+        self.data_load(result)
+
+    def data_load(self, data):
+        self.model.set_events(data)
+        self.set_busy()
         self.adjust_size(height=True)
 
-    def load_races(self, item: QTreeWidgetItem):
-        eid = item.data(0, Qt.UserRole)
-        if not eid:
+    def load_races(self, eid):
+        refresh = self.force_refresh and eid not in self.refreshed
+        self.refreshed.add(eid)
+
+        call = self.client.get(f"/api/event/edit/?id={eid}", auth=True, cache_ttl=BROWSER_CACHE_TTL, refresh=refresh)
+        call.finished.connect(partial(self.races_load, eid))
+        self.races_calls[eid] = call
+        self.set_busy()
+
+    def races_load(self, eid, event_admin: ROBisResponse):
+        self.races_calls.pop(eid, None)
+
+        if event_admin.status_code != 200:
+            self.race_load([], eid)
             return
-        
-        if self.rthr and self.rthr.isRunning():
-            self.rthr.terminate()
-            self.rthr.wait()
-
-        self.rthr = RaceLoadThread(item)
-        self.rthr.data.connect(self.race_load)
-        self.rthr.start()
-        self.progress_bar.setRange(0, 0)
-
-    def race_load(self, data, item: QTreeWidgetItem):
-        if len(data) == 0:
-            item.addChild(QTreeWidgetItem(["", "Nejste správce!"]))
-        else:
-            for race in data:
-                child = QTreeWidgetItem([race["date"].strftime("%d. %m."), race["name"]])
-                child.setData(0, Qt.UserRole + 1, race["apikey"])
-                item.addChild(child)
 
-        for i in range(self.tree.topLevelItemCount()):
-            cit = self.tree.topLevelItem(i)
-            cit.setExpanded(False)
+        ev_adm = event_admin.json()
 
-        self.progress_bar.setRange(0, 1)
-        self.progress_bar.setValue(1)
+        self.race_load(list(map(lambda x: {"name": x["race_name"],
+                                           "date": datetime.strptime(x["race_date"], "%Y-%m-%d"),
+                                           "apikey": x["race_api_key"]}, ev_adm["races"][1:])), eid)
 
-        item.setExpanded(True)
+    def race_load(self, data, eid):
+        self.model.set_races(eid, data)
+        self.set_busy()
 
-    def open_race(self, item: QTreeWidgetItem):
-        apikey = item.data(0, Qt.UserRole + 1)
+    def set_busy(self):
+        if self.events_call or self.races_calls:
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 1)
+            self.progress_bar.setValue(1)
+
+    def cancel_races(self):
+        for call in self.races_calls.values():
+            call.cancel()
+        self.races_calls.clear()
+
+    def expand_only(self, index: QModelIndex):
+        if index.parent().isValid():
+            return
+        expand = not self.tree.isExpanded(index)
+        self.tree.collapseAll()
+        if expand:
+            self.tree.expand(index)
+
+    def open_race(self, index: QModelIndex):
+        apikey = index.data(Qt.UserRole + 1)
         if not apikey:
             return
 
@@ -200,35 +343,47 @@ class ROBisWebConfigWindow(QWidget):
         self.robiswin._download()
         self.close()
 
-    def adjust_size(self, height=False):
-        for i in range(self.tree.columnCount()):
-            self.tree.resizeColumnToContents(i)
+    def open_stages(self):
+        index = self.proxy.mapToSource(self.tree.currentIndex())
+        event = self.model.node(index)
+        if not event:
+            return
+        event = event.parent or event
 
-        header = self.tree.header()
-        total_column_width = 0
-        for i in range(header.count()):
-            total_column_width += header.sectionSize(i)
+        races = [{"name": race.name, "date": race.date.date().isoformat(), "apikey": race.apikey}
+                 for race in event.children or [] if race.apikey]
+        if not races:
+            QMessageBox.warning(self, "Etapy", "Soutěž nemá žádné etapy, které spravujete. Rozbalte ji kliknutím.")
+            return
+
+        self.robiswin._show()
+        self.robiswin._prepare_stages(event.name, races)
+        self.close()
 
-        total_height = 0
+    def adjust_size(self, height=False):
+        # Sized from the font and the row count only, the view is never walked row by row.
+        metrics = self.tree.fontMetrics()
+        padding = metrics.averageCharWidth() * 4
+        longest = max((len(event.name) for event in self.model.events), default=20)
+        date_width = metrics.horizontalAdvance("00. 00. 0000") + padding
+        name_width = metrics.averageCharWidth() * min(longest, 80) + padding
+        self.tree.header().resizeSection(0, date_width)
 
-        iterator = QTreeWidgetItemIterator(self.tree)
-        while iterator.value():
-            item = iterator.value()
-            total_height += self.tree.visualItemRect(item).height()
-            iterator += 1
+        row_height = metrics.height() + 6
+        rows = min(len(self.model.events), 30)
 
         scrollbar_width = self.tree.verticalScrollBar().sizeHint().width()
 
         frame_size = self.tree.frameWidth() * 2
-        final_width = total_column_width + scrollbar_width + frame_size + 10
-        final_height = total_height + frame_size + 10 + 150
+        final_width = date_width + name_width + scrollbar_width + frame_size + 10
+        final_height = rows * row_height + self.tree.header().sizeHint().height() + frame_size + 10 + 150
 
         self.resize(final_width, final_height if height else self.height())
 
     def closeEvent(self, event):
-        if self.thr.isRunning():
-            self.thr.terminate()
-            self.thr.wait()
-        if self.rthr.isRunning():
-            self.rthr.terminate()
-            self.rthr.wait()
+        if self.events_call:
+            self.events_call.cancel()
+            self.events_call = None
+        self.cancel_races()
+        self.progress_bar.setRange(0, 1)
+        super().closeEvent(event)
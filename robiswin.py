@@ -1,87 +1,467 @@
+import cProfile
+import hashlib
+import io
 import json
 import os
+import pstats
+import queue
+import time
 from datetime import datetime, timedelta
+from functools import partial
 
-import requests
-from PySide6.QtCore import QByteArray, QUrl, Slot, QThread, Signal
-from PySide6.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
+from PySide6.QtCore import QCoreApplication, QObject, QThread, QTimer, Signal
 from PySide6.QtWidgets import (
+    QComboBox,
     QFormLayout,
     QLabel,
     QLineEdit,
     QMessageBox,
+    QProgressBar,
     QPushButton,
     QTextBrowser,
     QWidget,
 )
 from dateutil.parser import parser
 from sqlalchemy import Delete, Select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 import api
 import results
 from exports import json_results as res_json
 from exports import json_startlist as stl_json
-from models import Category, Runner, Control
+from models import Category, Punch, Runner
+from robismetrics import ROBisMetrics, ROBisMetricsWindow
+from robisnet import ROBisResponse
+from robisoutbox import ROBisOutbox, sidecar_path
+from robisserialize import ROBisSerializer, export_race
+from robissnapshot import ROBisSnapshots, race_changes, snapshot_path
 from robiswebconfig import ROBisWebConfigWindow
 
-ROBIS_URL = os.getenv("ARDF_ROBIS_URL", "https://rob-is.cz")
+OCHECK_INTERVAL_MS = 60000
+OCHECK_FAST_INTERVAL_MS = 15000
+OCHECK_IDLE_MAX_MS = 300000
+OCHECK_START_WINDOW_BEFORE = timedelta(minutes=30)
+OCHECK_START_WINDOW_AFTER = timedelta(hours=2)
+ONLINE_FLUSH_MS = int(os.getenv("ARDF_ROBIS_FLUSH_MS", "1500"))
+ONLINE_BATCH_MAX = int(os.getenv("ARDF_ROBIS_BATCH_MAX", "200"))
+OUTBOX_RETRY_MS = 5000
+# Edits made elsewhere in ARDFEvent are pushed at most this long after they were committed.
+DIRTY_DEBOUNCE_MS = int(os.getenv("ARDF_ROBIS_DIRTY_MS", "2000"))
+IMPORT_CHUNK = 500
+PROFILE_LINES = 40
+# Basic info key with the stages of the multi-day event the open file belongs to.
+STAGES_INFO = "robis_stages"
+
+OUTBOX_LABELS = {
+    "online": "Online výsledky",
+    "startlist": "Startovka",
+    "race": "Kontroly",
+    "results": "Finální výsledky",
+}
+
+
+class ROBisOChecklistPoller(QObject):
+    def __init__(self, robiswin) -> None:
+        super().__init__(robiswin)
+        self.robiswin = robiswin
+        self.apikey = robiswin.api_edit.text()
+        self.call = None
+        self.last_payload = None
+        self.seen = {}
+        self.idle_interval = OCHECK_INTERVAL_MS
 
+        try:
+            self.tzero = datetime.fromisoformat(api.get_basic_info(robiswin.mw.db)["date_tzero"])
+        except (KeyError, TypeError, ValueError):
+            self.tzero = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.poll)
+
+    def start(self) -> None:
+        self.poll()
+
+    def stop(self) -> None:
+        self.timer.stop()
+        if self.call:
+            self.call.cancel()
+            self.call = None
+
+    def poll(self) -> None:
+        if self.call:
+            return
+        self.call = self.robiswin.client.get("/api/ochecklist/", headers={"Key": self.apikey})
+        self.call.finished.connect(self.process)
+
+    def next_interval(self, changed: bool) -> int:
+        if self.tzero:
+            now = datetime.now(self.tzero.tzinfo)
+            if self.tzero - OCHECK_START_WINDOW_BEFORE <= now <= self.tzero + OCHECK_START_WINDOW_AFTER:
+                return OCHECK_FAST_INTERVAL_MS
+
+        # Back off while the feed stays the same, return to the base interval on the first change.
+        self.idle_interval = OCHECK_INTERVAL_MS if changed else min(self.idle_interval * 2, OCHECK_IDLE_MAX_MS)
+        return self.idle_interval
+
+    def process(self, ocheckdata: ROBisResponse) -> None:
+        self.call = None
+        started = time.perf_counter()
+
+        if ocheckdata.status_code != 200:
+            self.robiswin.message.emit(
+                f"Chyba stahování z OChecklist ({ocheckdata.status_code or ocheckdata.error})"
+            )
+            self.robiswin.metrics.count("ochecklist chyby")
+            self.timer.start(OCHECK_INTERVAL_MS)
+            return
+
+        changed = ocheckdata.content != self.last_payload
+        if changed:
+            self.last_payload = ocheckdata.content
+            self.apply(ocheckdata.json())
+        self.robiswin.metrics.record("ochecklist", (time.perf_counter() - started) * 1000,
+                                     received=len(ocheckdata.content))
+
+        self.timer.start(self.next_interval(changed))
+
+    def apply(self, ocheckjson: list) -> None:
+        entries = {}
+        for runner in ocheckjson:
+            digest = json.dumps(runner, sort_keys=True)
+            key = str(runner["competitor_index"])
+            if self.seen.get(key) == digest:
+                continue
+            try:
+                id = int(runner["competitor_index"])
+            except:
+                self.seen[key] = digest
+                self.robiswin.message.emit(
+                    f"OChecklist (záv. {runner["competitor_name"]}) není ID číslo. Používáte IOF XML z ARDFEventu (nikoli z ROBisu)?"
+                )
+                continue
+            entries[id] = (key, digest, runner)
+
+        if not entries:
+            return
+
+        with Session(self.robiswin.mw.db) as sess:
+            dbrunners = {
+                dbrunner.id: dbrunner
+                for dbrunner in sess.scalars(Select(Runner).where(Runner.id.in_(list(entries)))).all()
+            }
+
+            modified = False
+            for id, (key, digest, runner) in entries.items():
+                dbrunner = dbrunners.get(id)
+                if not dbrunner:
+                    self.robiswin.message.emit(
+                        f"OChecklist (záv. {runner["competitor_name"]}) nebyl nalezen závodník s ID {id}."
+                    )
+                    continue
+
+                self.seen[key] = digest
+
+                if dbrunner.ocheck_processed:
+                    continue
+
+                if runner["competitor_status"] == "DNS":
+                    dbrunner.manual_dns = True
+                    dbrunner.ocheck_processed = True
+                    modified = True
+                    self.robiswin.message.emit(
+                        f"OChecklist (záv. {runner["competitor_name"]}) nevystartoval"
+                    )
+                if runner["competitor_new_si_number"]:
+                    dbrunner.si = runner["competitor_new_si_number"]
+                    dbrunner.ocheck_processed = True
+                    modified = True
+                    self.robiswin.message.emit(
+                        f"OChecklist (záv. {runner["competitor_name"]}) má jiný pič: {runner["competitor_new_si_number"]}"
+                    )
+                if runner["competitor_status"] == "LATE":
+                    dbrunner.ocheck_processed = True
+                    modified = True
+                    self.robiswin.message.emit(
+                        f"OChecklist (záv. {runner["competitor_name"]}) vystartoval pozdě"
+                    )
+
+            if modified:
+                sess.commit()
+
+
+def entry_fields(competitor: dict) -> dict:
+    return {
+        "name": competitor["last_name"] + ", " + competitor["first_name"],
+        "club": competitor["competitor_club"],
+        "si": competitor["si_number"] or 0,
+        "category": competitor["competitor_category"],
+    }
+
+
+def entries_diff(db, competitors: list[dict]) -> dict:
+    diff = {"insert": [], "update": [], "remove": []}
+
+    with Session(db) as sess:
+        runners = {}
+        for runner in sess.scalars(Select(Runner).options(joinedload(Runner.category))).all():
+            if runner.reg:
+                runners.setdefault(str(runner.reg), runner)
+
+        for competitor in competitors:
+            runner = runners.pop(str(competitor["competitor_index"]), None)
+            if not runner:
+                diff["insert"].append(competitor)
+                continue
+
+            fields = entry_fields(competitor)
+            current = {
+                "name": runner.name,
+                "club": runner.club,
+                "si": runner.si,
+                "category": runner.category.name if runner.category else None,
+            }
+            # A chip swapped via OChecklist is newer than what ROBis has.
+            if runner.ocheck_processed:
+                del fields["si"]
+            changes = {field: (current[field], value) for field, value in fields.items() if current[field] != value}
+            if changes:
+                diff["update"].append((runner.id, runner.name, changes))
+
+        diff["remove"] = [(runner.id, runner.name) for runner in runners.values()]
+
+    return diff
+
+
+class ROBisImportThread(QThread):
+    progress = Signal(int, int)
+    message = Signal(str)
+
+    def __init__(self, parent, race: dict, diff: dict | None = None, delete_removed: bool = False) -> None:
+        super().__init__(parent)
+        self.db = parent.mw.db
+        self.metrics = parent.metrics
+        self.race = race
+        self.diff = diff
+        self.delete_removed = delete_removed
+        self.completed = False
+        self.error = None
+
+    def run(self) -> None:
+        try:
+            with self.metrics.timed("import"):
+                self.load()
+        except Exception as e:
+            # The session was left without a commit, the database is as it was before the import.
+            self.error = e
+            self.message.emit(f"{datetime.now().strftime('%H:%M:%S')} - Import selhal: {e!r}")
+
+    def load(self) -> None:
+        if self.diff is None:
+            competitors = self.race["competitors"]
+            updates = []
+        else:
+            competitors = self.diff["insert"]
+            updates = self.diff["update"]
+        total = len(competitors) + len(updates)
+        self.progress.emit(0, total)
+
+        with Session(self.db) as sess:
+            if self.diff is None:
+                sess.execute(Delete(Runner))
+            elif self.delete_removed and self.diff["remove"]:
+                sess.execute(Delete(Runner).where(Runner.id.in_([id for id, _ in self.diff["remove"]])))
+
+            categories = {cat.name: cat for cat in sess.scalars(Select(Category)).all()}
+
+            new_categories = []
+            for name in dict.fromkeys(cat["category_name"] for cat in self.race["categories"]):
+                if name in categories:
+                    continue
+                categories[name] = Category(name=name, controls=[], display_controls="")
+                new_categories.append(categories[name])
+                self.message.emit(f"{datetime.now().strftime('%H:%M:%S')} - Přidávám kategorii {name}")
+            sess.add_all(new_categories)
+
+            if updates:
+                runners = sess.scalars(Select(Runner).where(Runner.id.in_([id for id, _, _ in updates]))).all()
+                runners = {runner.id: runner for runner in runners}
+                for id, _, changes in updates:
+                    runner = runners.get(id)
+                    if not runner:
+                        continue
+                    for field, (_, value) in changes.items():
+                        setattr(runner, field, categories.get(value) if field == "category" else value)
+                sess.flush()
+                self.progress.emit(len(updates), total)
+
+            # Runners are added in chunks, SQLAlchemy flushes each chunk as one multi-row INSERT.
+            for start in range(0, len(competitors), IMPORT_CHUNK):
+                # Nothing is committed until the end, leaving the session rolls the import back.
+                if self.isInterruptionRequested():
+                    return
+                chunk = competitors[start:start + IMPORT_CHUNK]
+                sess.add_all(
+                    Runner(
+                        **{
+                            **entry_fields(runner),
+                            "category": categories.get(runner["competitor_category"]),
+                        },
+                        reg=runner["competitor_index"],
+                        call="",
+                    )
+                    for runner in chunk
+                )
+                sess.flush()
+                self.progress.emit(len(updates) + start + len(chunk), total)
+
+            if self.isInterruptionRequested():
+                return
+            sess.commit()
+            self.completed = True
+
+
+class ROBisReadoutWorker(QThread):
+    results = Signal(str, list, bool)
+    message = Signal(str)
+    profiled = Signal(str)
 
-class ROBisOChecklistThread(QThread):
     def __init__(self, parent) -> None:
         super().__init__(parent)
-        self.parent = parent
-        self.apikey = parent.api_edit.text()
+        self.metrics = parent.metrics
+        self.profile_next = False
+        self.queue = queue.Queue()
+        self.serializer = ROBisSerializer()
+        self.emitted = {}
+        self.apikey = None
+
+    def enqueue(self, db, si: int, all: bool = False) -> None:
+        self.queue.put((db, "all" if all else "readout", si))
+
+    def enqueue_changes(self, db, punches: set, runners: set, categories: set) -> None:
+        for si in punches:
+            self.queue.put((db, "readout", si))
+        for si in runners:
+            self.queue.put((db, "runner", si))
+        for id in categories:
+            self.queue.put((db, "category", id))
+
+    def stop(self) -> None:
+        self.queue.put(None)
+        self.wait()
+
+    def set_profile_next(self, enabled: bool) -> None:
+        self.profile_next = enabled
 
     def run(self) -> None:
         while True:
-            ocheckdata = requests.get(f"{ROBIS_URL}/api/ochecklist/", headers={"Key": self.apikey})
-            if ocheckdata.status_code == 200:
-                ocheckjson = ocheckdata.json()
-                with Session(self.parent.mw.db) as sess:
-                    for runner in ocheckjson:
-                        try:
-                            id = int(runner["competitor_index"])
-                        except:
-                            self.parent.message.emit(
-                                f"OChecklist (záv. {runner["competitor_name"]}) není ID číslo. Používáte IOF XML z ARDFEventu (nikoli z ROBisu)?"
-                            )
-                            continue
-                        dbrunner = sess.scalars(Select(Runner).where(Runner.id == id)).one_or_none()
-                        if not dbrunner:
-                            self.parent.message.emit(
-                                f"OChecklist (záv. {runner["competitor_name"]}) nebyl nalezen závodník s ID {id}."
-                            )
-                            continue
-
-                        if dbrunner.ocheck_processed:
-                            continue
-
-                        if runner["competitor_status"] == "DNS":
-                            dbrunner.manual_dns = True
-                            dbrunner.ocheck_processed = True
-                            self.parent.message.emit(
-                                f"OChecklist (záv. {runner["competitor_name"]}) nevystartoval"
-                            )
-                        if runner["competitor_new_si_number"]:
-                            dbrunner.si = runner["competitor_new_si_number"]
-                            dbrunner.ocheck_processed = True
-                            self.parent.message.emit(
-                                f"OChecklist (záv. {runner["competitor_name"]}) má jiný pič: {runner["competitor_new_si_number"]}"
-                            )
-                        if runner["competitor_status"] == "LATE":
-                            dbrunner.ocheck_processed = True
-                            self.parent.message.emit(
-                                f"OChecklist (záv. {runner["competitor_name"]}) vystartoval pozdě"
-                            )
-                    sess.commit()
+            items = [self.queue.get()]
+            # Readouts that piled up while the previous batch was computed are handled together.
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in items:
+                return
 
-            else:
-                self.parent.message.emit(
-                    f"Chyba stahování z OChecklist ({ocheckdata.status_code})"
-                )
-            self.sleep(60)
+            self.metrics.gauge("fronta odečtů", len(items))
+            # A batch can span an event switch, each file's readouts are computed against that file.
+            batches = {}
+            for item in items:
+                batches.setdefault(item[0], []).append(item)
+            for batch in batches.values():
+                try:
+                    if self.profile_next:
+                        self.profile(batch)
+                    else:
+                        with self.metrics.timed("odečet"):
+                            self.process(batch)
+                except Exception as e:
+                    self.message.emit(f"{datetime.now().strftime("%H:%M:%S")} - Online výsledky: chyba výpočtu {e!r}")
+
+    def profile(self, items: list) -> None:
+        self.profile_next = False
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(self.process, items)
+        finally:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            self.profiled.emit(out.getvalue())
+
+    def process(self, items: list) -> None:
+        db = items[0][0]
+        apikey = api.get_basic_info(db)["robis_api"]
+        if not apikey:
+            return
+
+        if apikey != self.apikey:
+            self.emitted.clear()
+            self.apikey = apikey
+
+        kinds = {}
+        for _, kind, value in items:
+            kinds.setdefault(kind, set()).add(value)
+
+        # A full refresh covers every readout queued together with it.
+        if "all" in kinds:
+            self.refresh_all(db, apikey)
+        else:
+            self.readout(db, apikey, kinds.get("readout", set()), kinds.get("runner", set()),
+                         kinds.get("category", set()))
+
+    def readout(self, db, apikey: str, sis: set[int], runner_sis: set[int] = frozenset(),
+                category_ids: set[int] = frozenset()) -> None:
+        with Session(db) as sess:
+            runners = sess.scalars(
+                Select(Runner).where(Runner.si.in_(sis | runner_sis)).options(joinedload(Runner.category))
+            ).all()
+            # New punches and a DNS make a competitor new on ROBis. An edited runner, e.g. a new SI or
+            # category, is new only once it has punches, otherwise it is resent only if ROBis has it.
+            started = set(sess.scalars(Select(Punch.si).where(Punch.si.in_(runner_sis)).distinct())) if runner_sis else set()
+            regs = {runner.reg for runner in runners if runner.si in sis or runner.si in started}
+            category_names = list(dict.fromkeys(runner.category.name for runner in runners if runner.category))
+            if category_ids:
+                category_names += [
+                    name for name in sess.scalars(Select(Category.name).where(Category.id.in_(category_ids)))
+                    if name not in category_names
+                ]
+
+        changed = self.serialize(db, category_names, regs, False)
+        if changed:
+            self.results.emit(apikey, changed, False)
+
+    def refresh_all(self, db, apikey: str) -> None:
+        with self.metrics.timed("aktualizace všech") as span:
+            with Session(db) as sess:
+                category_names = sess.scalars(Select(Category.name)).all()
+            changed = self.serialize(db, category_names, set(), True)
+            span.sent = sum(len(serialized) for _, serialized, _ in changed)
+        self.results.emit(apikey, changed, True)
+
+    def serialize(self, db, category_names: list[str], regs: set, all: bool) -> list[tuple]:
+        changed = []
+        serialize_ms = 0.0
+        serialized_bytes = 0
+
+        for category_name in category_names:
+            with self.metrics.timed("calculate_category"):
+                category_results = results.calculate_category(db, category_name)
+            for result in category_results:
+                key = json.dumps([category_name, result.reg])
+                started = time.perf_counter()
+                serialized = self.serializer.serialize(category_name, result).json
+                serialize_ms += (time.perf_counter() - started) * 1000
+                serialized_bytes += len(serialized)
+                # Read-out competitors always go to the GUI, which dedupes them against what ROBis has.
+                if not all and result.reg not in regs and self.emitted.get(key) == serialized:
+                    continue
+                self.emitted[key] = serialized
+                changed.append((key, serialized, result.reg in regs))
+
+        self.metrics.record("serializace", serialize_ms, serialized_bytes)
+        return changed
 
 
 class ROBisWindow(QWidget):
@@ -92,14 +472,15 @@ class ROBisWindow(QWidget):
 
         self.mw = mw
         self.plugin = plugin
+        self.client = plugin.get_client()
 
         lay = QFormLayout()
         self.setLayout(lay)
 
-        self.webconfigwin = ROBisWebConfigWindow(self.mw, self)
+        self.webconfigwin = None
 
         self.webbtn = QPushButton()
-        self.webbtn.clicked.connect(self.webconfigwin.show)
+        self.webbtn.clicked.connect(self._show_webconfig)
         lay.addRow(self.webbtn)
 
         self.api_edit = QLineEdit()
@@ -109,14 +490,33 @@ class ROBisWindow(QWidget):
         self.ok_btn.clicked.connect(self._on_ok)
         lay.addRow(self.ok_btn)
 
+        self.stage_lbl = QLabel("Etapa")
+        self.stage_combo = QComboBox()
+        self.stage_combo.activated.connect(self._select_stage)
+        lay.addRow(self.stage_lbl, self.stage_combo)
+        self.stage_lbl.hide()
+        self.stage_combo.hide()
+
         lay.addRow(QLabel(""))
 
         self.download_btn = QPushButton(
             "Stáhnout přihlášky, kategorie - Pozor! Tato akce smaže všechny stávající závodníky!"
         )
-        self.download_btn.clicked.connect(self._download)
+        self.download_btn.clicked.connect(lambda: self._download())
         lay.addRow(self.download_btn)
 
+        self.sync_btn = QPushButton("Synchronizovat přihlášky (zachová stávající závodníky)")
+        self.sync_btn.clicked.connect(lambda: self._download(sync=True))
+        lay.addRow(self.sync_btn)
+
+        self.snapshot_btn = QPushButton("Importovat z posledního staženého snímku (bez internetu)")
+        self.snapshot_btn.clicked.connect(lambda: self._import_snapshot())
+        lay.addRow(self.snapshot_btn)
+
+        self.import_progress = QProgressBar()
+        self.import_progress.hide()
+        lay.addRow(self.import_progress)
+
         self.startlistcontrols_btn = QPushButton("Nahrát startovku a kontroly")
         self.startlistcontrols_btn.clicked.connect(self._upload_stlcontrols)
         lay.addRow(self.startlistcontrols_btn)
@@ -136,16 +536,65 @@ class ROBisWindow(QWidget):
         self.upload_btn.clicked.connect(self._upload_res)
         lay.addRow(self.upload_btn)
 
+        self.metrics_btn = QPushButton("Statistiky a profilování")
+        lay.addRow(self.metrics_btn)
+
         lay.addRow(QLabel(""))
 
         self.log = QTextBrowser()
         lay.addWidget(self.log)
         self.message.connect(self.log.append)
 
-        self.nmmanager = QNetworkAccessManager(self)
-        self.nmmanager.finished.connect(self.handle_online_res_reply)
+        self.outbox = None
+        self.outbox_inflight = {}
+        self.snapshots = None
+        self.from_snapshot = False
+
+        self.online_apikey = None
+        self.online_sent = {}
+        # Outbox ids of online rows from a rejected batch, each of them is sent on its own.
+        self.online_solo = set()
+
+        self.metrics = ROBisMetrics()
+
+        self.readout_worker = ROBisReadoutWorker(self)
+        self.readout_worker.results.connect(self._queue_online)
+        self.readout_worker.message.connect(self.log.append)
+        # As a main window tab, the window gets no closeEvent when ARDFEvent quits.
+        QCoreApplication.instance().aboutToQuit.connect(self._stop_threads)
+
+        self.metricswin = None
+        self.metrics_btn.clicked.connect(self._show_metrics)
+
+        self.dirty_punches = set()
+        self.dirty_runners = set()
+        self.dirty_categories = set()
+
+        self.dirty_timer = QTimer(self)
+        self.dirty_timer.setSingleShot(True)
+        self.dirty_timer.setInterval(DIRTY_DEBOUNCE_MS)
+        self.dirty_timer.timeout.connect(self._flush_dirty)
+
+        self.tracker = plugin.get_tracker()
+        self.tracker.changed.connect(self._mark_dirty)
+
+        self.online_timer = QTimer(self)
+        self.online_timer.setSingleShot(True)
+        self.online_timer.setInterval(ONLINE_FLUSH_MS)
+        self.online_timer.timeout.connect(self._flush_online)
+
+        self.outbox_timer = QTimer(self)
+        self.outbox_timer.setInterval(OUTBOX_RETRY_MS)
+        self.outbox_timer.timeout.connect(self._drain_outbox)
+        self.outbox_timer.start()
 
         self.proc = None
+        self.download_call = None
+        self.download_started = 0.0
+        self.download_sync = False
+        self.import_thread = None
+        # Key of the race the file belonged to before a stage switch that is still being imported.
+        self.switch_from = None
 
     def _on_ok(self):
         api.set_basic_info(
@@ -158,109 +607,257 @@ class ROBisWindow(QWidget):
     def _show(self):
         basic_info = api.get_basic_info(self.mw.db)
 
-        cookie = api.get_config_value("robis-cookie")
+        cookie = self.client.auth.token
         self.webbtn.setText(
             f"Vybrat závod ze seznamu{" - přihlaste se (Pluginy > Přihlášení do ROBisu)" if not cookie else ""}")
         self.webbtn.setEnabled(cookie is not None)
 
         self.api_edit.setText(basic_info["robis_api"])
+        self._load_stages()
+
+    def _load_stages(self):
+        stages = json.loads(api.get_basic_info(self.mw.db).get(STAGES_INFO) or "null")
+
+        self.stage_combo.clear()
+        if stages:
+            for race in stages["races"]:
+                self.stage_combo.addItem(f"{race["date"]} {race["name"]}", race["apikey"])
+            self.stage_combo.setCurrentIndex(self.stage_combo.findData(self.api_edit.text()))
+        self.stage_lbl.setVisible(bool(stages))
+        self.stage_combo.setVisible(bool(stages))
+
+    def _select_stage(self, index: int):
+        apikey = self.stage_combo.itemData(index)
+        if not apikey or apikey == self.api_edit.text():
+            return
+        if self.download_call or self.import_thread or not self._can_switch_race():
+            self.stage_combo.setCurrentIndex(self.stage_combo.findData(self.api_edit.text()))
+            return
+
+        self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Etapa: {self.stage_combo.itemText(index)}")
+        # The file takes the stage's entries, nothing of the previous stage is left to be sent to this one.
+        # Its key changes only once they are imported, see _import_done.
+        self.switch_from = self.api_edit.text()
+        self.api_edit.setText(apikey)
+        self._download()
+
+    def _file_contents(self) -> tuple[bool, bool]:
+        with Session(self.mw.db) as sess:
+            punches = sess.scalars(Select(Punch).limit(1)).first() is not None
+            runners = sess.scalars(Select(Runner).limit(1)).first() is not None
+        return punches, runners
+
+    def _can_switch_race(self) -> bool:
+        # Runners and punches in the file belong to the race of its current key.
+        if not api.get_basic_info(self.mw.db)["robis_api"]:
+            return True
+        punches, runners = self._file_contents()
+        if punches:
+            QMessageBox.warning(
+                self,
+                "Etapa",
+                "Soubor už obsahuje vyčtené čipy jiného závodu. Pro tuto etapu otevřete nebo založte její vlastní soubor.",
+            )
+            return False
+        if runners:
+            return QMessageBox.question(
+                self,
+                "Etapa",
+                "Soubor obsahuje přihlášky jiného závodu. Nahradit je přihláškami vybrané etapy?",
+            ) == QMessageBox.StandardButton.Yes
+        return True
+
+    def _prepare_stages(self, event_name: str, races: list[dict]):
+        if self.download_call or self.import_thread:
+            return
+
+        apikeys = [race["apikey"] for race in races]
+        apikey = self.api_edit.text()
+        if apikey not in apikeys and not self._can_switch_race():
+            return
+
+        api.set_basic_info(self.mw.db, {STAGES_INFO: json.dumps({"event": event_name, "races": races})})
+
+        if apikey in apikeys:
+            # The file already belongs to a stage, its entries are synced rather than replaced.
+            self.download_sync = self._file_contents()[1]
+        else:
+            today = datetime.now().date().isoformat()
+            self.switch_from = apikey
+            apikey = next((race["apikey"] for race in races if race["date"] == today), apikeys[0])
+            self.api_edit.setText(apikey)
+            self.download_sync = False
+        self._load_stages()
+
+        self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Stahuji {len(races)} etap soutěže {event_name}...")
+        calls = []
+        for apikey in apikeys:
+            calls.append(self.client.get("/api/?type=json&name=event", apikey=apikey, cache_ttl=0))
+            calls.append(self.client.get("/api/?type=json&name=race", apikey=apikey, cache_ttl=0))
+        # All stages in one round-trip; the stage this file belongs to is imported, the others wait in the cache.
+        self.download_call = self.client.gather(calls)
+        self.download_call.finished.connect(partial(self._stages_loaded, races, apikey))
+        self.download_started = time.perf_counter()
+        self._set_import_enabled(False)
+
+    def _stages_loaded(self, races: list[dict], apikey: str, responses: list[ROBisResponse]):
+        current = None
+        for i, race in enumerate(races):
+            response_event, response_race = responses[2 * i:2 * i + 2]
+            if response_race.status_code == 200:
+                status = f"{len(response_race.json()["competitors"])} přihlášených"
+            else:
+                status = f"chyba {response_race.status_code or response_race.error}"
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - {race["name"]}: {status}")
+            if race["apikey"] == apikey:
+                current = [response_event, response_race]
+            elif response_event.status_code == 200 and response_race.status_code == 200:
+                self._store_snapshot(race["apikey"], response_event, response_race)
+
+        if current is None:
+            self.download_call = None
+            self._import_done(False)
+            return
+        self._import(current)
+
+    def _show_webconfig(self):
+        if not self.webconfigwin:
+            self.webconfigwin = ROBisWebConfigWindow(self.mw, self)
+        self.webconfigwin.show()
+
+    def _show_metrics(self):
+        if not self.metricswin:
+            self.metricswin = ROBisMetricsWindow(self)
+        self.metricswin.show()
 
     def _toggle_ocheck(self):
         if self.proc:
-            self.proc.terminate()
-            self.proc.wait()
+            self.proc.stop()
             self.proc = None
         else:
-            self.proc = ROBisOChecklistThread(self)
-            self.proc.started.connect(self._proc_running)
-            self.proc.finished.connect(self._proc_stopped)
+            self.proc = ROBisOChecklistPoller(self)
             self.proc.start()
+        self.ocheck_btn.setChecked(self.proc is not None)
 
-    def _proc_running(self):
-        self.ocheck_btn.setChecked(True)
+    def _upload_stlcontrols(self):
+        with self.metrics.timed("export startlist") as span:
+            startlist = stl_json.export(self.mw.db).encode("utf-8")
+            span.sent = len(startlist)
+        self._queue_upload("startlist", "POST", "/api/startlist/?valid=True", startlist, skip_unchanged=True)
 
-    def _proc_stopped(self, msg=None):
-        self.ocheck_btn.setChecked(False)
+        with self.metrics.timed("export race") as span:
+            race = json.dumps(export_race(self.mw.db)).encode("utf-8")
+            span.sent = len(race)
+        self._queue_upload("race", "PUT", "/api/race/", race, skip_unchanged=True)
 
-    def _upload_stlcontrols(self):
-        response_stl = requests.post(
-            f"{ROBIS_URL}/api/startlist/?valid=True",
-            stl_json.export(self.mw.db),
-            headers={
-                "Race-Api-Key": self.api_edit.text(),
-                "Content-Type": "application/json",
-            },
-        )
+    def closeEvent(self, event) -> None:
+        if self.proc:
+            self.proc.stop()
+            self.proc = None
+            self.ocheck_btn.setChecked(False)
+        if self.download_call:
+            self.download_call.cancel()
+            self.download_call = None
+            self._import_done(False)
+        self._stop_threads()
+        super().closeEvent(event)
 
-        self.log.append(
-            f"{datetime.now().strftime("%H:%M:%S")} - Startovka: {response_stl.status_code} {response_stl.text}"
-        )
+    def _stop_threads(self):
+        # A running QThread must not outlive the window, Qt aborts the process when it is destroyed.
+        if self.import_thread:
+            self.import_thread.requestInterruption()
+            self.import_thread.wait()
+        if self.readout_worker.isRunning():
+            self.readout_worker.stop()
 
-        cats = []
+    def _upload_res(self):
+        with self.metrics.timed("export results") as span:
+            body = res_json.export(self.mw.db).encode("utf-8")
+            span.sent = len(body)
+        self._queue_upload("results", "POST", "/api/results/?valid=True", body)
 
-        with Session(self.mw.db) as sess:
-            for dbcat in sess.scalars(Select(Category)).all():
-                cat = {"category_name": dbcat.name, "category_control_points": []}
-                for control in dbcat.controls:
-                    cat["category_control_points"].append(
-                        {"si_code": control.code, "control_type": "BEACON" if control.mandatory else "CONTROL"})
-                cats.append(cat)
-
-            aliases = []
-
-            for cont in sess.scalars(Select(Control)).all():
-                for alias in aliases:
-                    if alias["alias_si_code"] == cont.code:
-                        alias["alias_name"] += f"/{cont.name}"
-                        break
-                else:
-                    aliases.append({"alias_si_code": cont.code, "alias_name": cont.name})
-
-        response_controls = requests.put(
-            f"{ROBIS_URL}/api/race/",
-            json={"categories": cats, "aliases": aliases},
-            headers={
-                "Race-Api-Key": self.api_edit.text(),
-                "Content-Type": "application/json",
-            }
-        )
+    def _download(self, sync: bool = False):
+        if self.download_call or self.import_thread:
+            return
+
+        self.download_sync = sync
 
+        self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Začínám importovat...")
+        apikey = self.api_edit.text()
+        self.download_call = self.client.gather([
+            self.client.get("/api/?type=json&name=event", apikey=apikey, cache_ttl=0),
+            self.client.get("/api/?type=json&name=race", apikey=apikey, cache_ttl=0),
+        ])
+        self.download_call.finished.connect(self._import)
+        self.download_started = time.perf_counter()
+        self._set_import_enabled(False)
+
+    def _set_import_enabled(self, enabled: bool):
+        self.download_btn.setEnabled(enabled)
+        self.sync_btn.setEnabled(enabled)
+        self.snapshot_btn.setEnabled(enabled)
+
+    def _get_snapshots(self) -> ROBisSnapshots:
+        if not self.snapshots:
+            self.snapshots = ROBisSnapshots(snapshot_path())
+        return self.snapshots
+
+    def _store_snapshot(self, apikey: str, response_event: ROBisResponse, response_race: ROBisResponse):
+        snapshots = self._get_snapshots()
+        previous = snapshots.latest(apikey)
+        if not snapshots.store(apikey, response_event.content, response_race.content) or not previous:
+            return
+
+        changes = race_changes(json.loads(previous.race), response_race.json())
         self.log.append(
-            f"{datetime.now().strftime("%H:%M:%S")} - Kontroly: {response_controls.status_code} {response_controls.text}"
+            f"{datetime.now().strftime("%H:%M:%S")} - Oproti snímku z {datetime.fromtimestamp(previous.fetched).strftime("%d. %m. %H:%M")}: "
+            f"nových {len(changes["added"])}, změněných {len(changes["changed"])}, odebraných {len(changes["removed"])}"
+            f"{", změnily se kategorie" if changes["categories"] else ""}"
         )
 
-    def closeEvent(self, event) -> None:
-        try:
-            self.proc.terminate()
-            self.proc.wait()
-        except:
-            ...
-        super().closeEvent(event)
+    def _import_snapshot(self, sync: bool = False):
+        if self.download_call or self.import_thread:
+            return
 
-    def _upload_res(self):
-        response = requests.post(
-            f"{ROBIS_URL}/api/results/?valid=True",
-            res_json.export(self.mw.db),
-            headers={
-                "Race-Api-Key": self.api_edit.text(),
-                "Content-Type": "application/json",
-            },
-        )
+        snapshot = self._get_snapshots().latest(self.api_edit.text())
+        if not snapshot:
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Pro tento API klíč není uložený žádný snímek")
+            return
 
         self.log.append(
-            f"{datetime.now().strftime("%H:%M:%S")} - Finální výsledky: {response.status_code} {response.text}"
+            f"{datetime.now().strftime("%H:%M:%S")} - Importuji snímek z {datetime.fromtimestamp(snapshot.fetched).strftime("%d. %m. %H:%M")}...")
+        self.download_sync = sync
+        self.download_started = time.perf_counter()
+        self.from_snapshot = True
+        self._import([
+            ROBisResponse(200, snapshot.event, None, {}, from_cache=True),
+            ROBisResponse(200, snapshot.race, None, {}, from_cache=True),
+        ])
+
+    def _import(self, responses: list[ROBisResponse]):
+        self.download_call = None
+        from_snapshot, self.from_snapshot = self.from_snapshot, False
+
+        response_event, response_race = responses
+        self.metrics.record(
+            "snapshot" if from_snapshot else "download", (time.perf_counter() - self.download_started) * 1000,
+            received=len(response_event.content) + len(response_race.content),
+            error=not (response_event.ok and response_race.ok),
         )
 
-    def _download(self):
-        self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Začínám importovat...")
-        response_event = requests.get(
-            f"{ROBIS_URL}/api/?type=json&name=event",
-            headers={"Race-Api-Key": self.api_edit.text()},
-        )
-        response_race = requests.get(
-            f"{ROBIS_URL}/api/?type=json&name=race",
-            headers={"Race-Api-Key": self.api_edit.text()},
-        )
+        if not from_snapshot:
+            if response_event.status_code == 200 and response_race.status_code == 200:
+                self._store_snapshot(self.api_edit.text(), response_event, response_race)
+            elif response_event.status_code is None or response_race.status_code is None:
+                # No answer from ROBis at all, the last download of this race can stand in for it.
+                snapshot = self._get_snapshots().latest(self.api_edit.text())
+                if snapshot and QMessageBox.question(
+                        self,
+                        "ROBis je nedostupný",
+                        f"ROBis neodpovídá. Importovat poslední stažená data z {datetime.fromtimestamp(snapshot.fetched).strftime("%d. %m. %H:%M")}?",
+                ) == QMessageBox.StandardButton.Yes:
+                    self._import_snapshot(self.download_sync)
+                    return
 
         event_name = ""
 
@@ -269,7 +866,7 @@ class ROBisWindow(QWidget):
             QMessageBox.critical(
                 self,
                 "Chyba",
-                f"Stahování dat o SOUTĚŽI se nezdařilo: {response_event.status_code}",
+                f"Stahování dat o SOUTĚŽI se nezdařilo: {response_event.status_code or response_event.error}",
             )
         else:
             event = response_event.json()
@@ -286,7 +883,7 @@ class ROBisWindow(QWidget):
             QMessageBox.critical(
                 self,
                 "Chyba",
-                f"Stahování dat o ZÁVODĚ se nezdařilo: {response_event.status_code}",
+                f"Stahování dat o ZÁVODĚ se nezdařilo: {response_race.status_code or response_race.error}",
             )
         else:
             race = response_race.json()
@@ -310,129 +907,260 @@ class ROBisWindow(QWidget):
                     },
                 )
 
-            with Session(self.mw.db) as sess:
-                sess.execute(Delete(Runner))
+            diff = None
+            delete_removed = False
+            if self.download_sync:
+                diff = entries_diff(self.mw.db, race["competitors"])
+                delete_removed = self._preview_sync(diff)
+                if delete_removed is None:
+                    self._import_done(False)
+                    return
+            else:
+                self.online_sent.clear()
+
+            self.import_thread = ROBisImportThread(self, race, diff, delete_removed)
+            self.import_thread.message.connect(self.log.append)
+            self.import_thread.progress.connect(self._import_progress)
+            self.import_thread.finished.connect(self._import_finished)
+            self.import_progress.show()
+            self.import_thread.start()
+            return
 
-                for cat in race["categories"]:
-                    if not len(
-                            sess.scalars(
-                                Select(Category).where(Category.name == cat["category_name"])
-                            ).all()
-                    ):
-                        sess.add(
-                            Category(
-                                name=cat["category_name"], controls=[], display_controls=""
-                            )
-                        )
-                        self.log.append(
-                            f"{datetime.now().strftime('%H:%M:%S')} - Přidávám kategorii {cat['category_name']}"
-                        )
-
-                for runner in race["competitors"]:
-                    sess.add(
-                        Runner(
-                            name=runner["last_name"] + ", " + runner["first_name"],
-                            club=runner["competitor_club"],
-                            si=runner["si_number"] or 0,
-                            reg=runner["competitor_index"],
-                            category=sess.scalars(
-                                Select(Category).where(
-                                    Category.name == runner["competitor_category"]
-                                )
-                            ).first(),
-                            call="",
-                        )
-                    )
-                sess.commit()
+        self._import_done(False)
 
-        self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Import OK")
+    def _preview_sync(self, diff: dict) -> bool | None:
+        lines = [f"+ {competitor["last_name"]}, {competitor["first_name"]} ({competitor["competitor_category"]})"
+                 for competitor in diff["insert"]]
+        for _, name, changes in diff["update"]:
+            lines.append(f"~ {name}: {", ".join(f"{field} {old} → {new}" for field, (old, new) in changes.items())}")
+        lines.extend(f"- {name}" for _, name in diff["remove"])
 
-    @Slot(QNetworkReply)
-    def handle_online_res_reply(self, reply: QNetworkReply):
-        self.log.append(
-            f"{datetime.now().strftime("%H:%M:%S")} - Online výsledky: {"OK" if reply.error() == QNetworkReply.NetworkError.NoError else f"ERROR: {reply.error().name}"} {reply.readAll().data().decode("utf-8")}"
-        )
+        if not lines:
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Přihlášky beze změn")
+            return None
 
-    def _send_online_readout(self, db, si: int, all: bool = False):
-        sess = Session(db)
+        box = QMessageBox(self)
+        box.setWindowTitle("Synchronizace přihlášek")
+        box.setText(
+            f"Nových: {len(diff["insert"])}, změněných: {len(diff["update"])}, v ROBisu chybí: {len(diff["remove"])}"
+        )
+        box.setDetailedText("\n".join(lines))
+        keep_btn = box.addButton("Synchronizovat", QMessageBox.ButtonRole.AcceptRole)
+        delete_btn = None
+        if diff["remove"]:
+            delete_btn = box.addButton("Synchronizovat a smazat chybějící", QMessageBox.ButtonRole.DestructiveRole)
+        box.addButton(QMessageBox.StandardButton.Cancel)
+        box.exec()
+
+        if box.clickedButton() == keep_btn:
+            return False
+        if delete_btn and box.clickedButton() == delete_btn:
+            return True
+        return None
+
+    def _import_progress(self, done: int, total: int):
+        self.import_progress.setRange(0, total)
+        self.import_progress.setValue(done)
+
+    def _import_finished(self):
+        completed = self.import_thread.completed
+        error = self.import_thread.error
+        self.import_thread = None
+        self.import_progress.hide()
+        self._import_done(completed)
+        if completed:
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Import OK")
+        elif error:
+            QMessageBox.critical(self, "Chyba", f"Import se nezdařil, nic nebylo uloženo: {error}")
+        else:
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Import přerušen, nic nebylo uloženo")
 
-        if not api.get_basic_info(db)["robis_api"]:
+    def _import_done(self, completed: bool):
+        self._set_import_enabled(True)
+        if self.switch_from is None:
             return
 
-        if not all:
-            runner = sess.scalars(Select(Runner).where(Runner.si == si)).one_or_none()
-            if not runner:
-                return
-            categories = [runner.category]
+        if completed:
+            self._on_ok()
+            # OChecklist follows the race the open file belongs to, online results read the key per batch.
+            if self.proc:
+                self._toggle_ocheck()
+                self._toggle_ocheck()
         else:
-            runner = None
-            categories = sess.scalars(Select(Category)).all()
+            # Without the new entries the file still holds the previous race, and keeps its key.
+            self.api_edit.setText(self.switch_from)
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - Závod souboru nezměněn")
+        self.switch_from = None
+        self._load_stages()
+
+    def _get_outbox(self) -> ROBisOutbox:
+        path = sidecar_path(self.mw.db)
+        if not self.outbox or self.outbox.path != path:
+            self.outbox = ROBisOutbox(path)
+        return self.outbox
+
+    def _queue_upload(self, kind: str, method: str, url: str, body: bytes, skip_unchanged: bool = False):
+        outbox = self._get_outbox()
+        apikey = self.api_edit.text()
+
+        if (skip_unchanged and not outbox.pending(kind, apikey)
+                and outbox.uploaded_digest(kind, apikey) == hashlib.sha256(body).hexdigest()):
+            self.log.append(f"{datetime.now().strftime("%H:%M:%S")} - {OUTBOX_LABELS[kind]}: beze změny, přeskočeno")
+            return
 
-        data = []
+        outbox.put(kind, apikey, "", method, url, body)
+        self._drain_outbox({(kind, apikey): body})
 
-        for category in categories:
-            results_cat = results.calculate_category(db, category.name)
+    def _drain_outbox(self, queued: dict | None = None):
+        if getattr(self.mw, "db", None) is None:
+            return
 
-            for result in results_cat:
-                if runner and runner.reg != result.reg:
-                    continue
-                order = []
-                last = result.start
-                for punch in result.order:
-                    order.append(
-                        {
-                            "code": punch[0],
-                            "control_type": "CONTROL" if punch[0] != "M" else "BEACON",
-                            "punch_status": punch[2],
-                            "split_time": results.format_delta(punch[1] - last),
-                        }
-                    )
-                    last = punch[1]
-                if result.finish:
-                    order.append(
-                        {
-                            "code": "F",
-                            "control_type": "FINISH",
-                            "punch_status": "OK",
-                            "split_time": results.format_delta(result.finish - last),
-                        }
-                    )
+        outbox = self._get_outbox()
+        busy = {(kind, rows[0][2]) for _, kind, rows, _ in self.outbox_inflight.values()}
 
-                data.append(
-                    {
-                        "competitor_index": result.reg,
-                        "si_number": result.si,
-                        "last_name": result.name.split(", ")[0],
-                        "first_name": result.name.split(", ")[1],
-                        "category_name": category.name,
-                        "result": {
-                            "run_time": results.format_delta(
-                                timedelta(seconds=result.time)
-                            ),
-                            "punch_count": result.tx,
-                            "result_status": result.status,
-                            "punches": order,
-                        },
-                    }
-                )
+        # One request per upload kind and race at a time, so an older payload can never overtake a newer one.
+        for row in outbox.due(with_body=False):
+            if (row[1], row[2]) not in busy:
+                busy.add((row[1], row[2]))
+                # A payload that was just queued is sent from memory rather than read back from the outbox.
+                body = queued.get((row[1], row[2])) if queued else None
+                self._send_outbox(outbox, row[1], [row], row[4], row[5], row[2],
+                                  body if body is not None else outbox.payload(row[0]))
 
-            sess.close()
+        if not self.online_timer.isActive():
+            self._flush_online()
 
-            print(data)
-            if not data:
-                return
+    def _flush_online(self):
+        self.online_timer.stop()
+        if any(kind == "online" for _, kind, _, _ in self.outbox_inflight.values()):
+            return
 
-            json_data = json.dumps(data)
-            byte_data = QByteArray(json_data.encode("utf-8"))
+        outbox = self._get_outbox()
+        rows = outbox.due("online", ONLINE_BATCH_MAX)
+        if not rows:
+            return
 
-            request = QNetworkRequest(QUrl(f"{ROBIS_URL}/api/results/?name=json"))
+        rows = [row for row in rows if row[2] == rows[0][2]]
+        rows = [row for row in rows if row[0] in self.online_solo][:1] or rows
+        body = b"[" + b",".join(row[6] for row in rows) + b"]"
 
-            request.setHeader(
-                QNetworkRequest.KnownHeaders.ContentTypeHeader, "application/json"
-            )
-            request.setRawHeader(
-                QByteArray("Race-Api-Key"),
-                QByteArray(api.get_basic_info(db)["robis_api"]),
-            )
+        self._send_outbox(outbox, "online", rows, "PUT", "/api/results/?name=json", rows[0][2], body)
+
+    def _send_outbox(self, outbox: ROBisOutbox, kind: str, rows: list, method: str, url: str, apikey: str,
+                     body: bytes):
+        call = self.client.request(
+            method,
+            url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            apikey=apikey,
+        )
+        started = time.perf_counter()
+        digest = hashlib.sha256(body).hexdigest() if kind != "online" else None
+        call.finished.connect(partial(self.handle_outbox_reply, call, outbox, kind, rows, started, digest, len(body)))
+        self.outbox_inflight[call] = (outbox, kind, rows, started)
+
+    def handle_outbox_reply(self, call, outbox: ROBisOutbox, kind: str, rows: list, started: float,
+                            digest: str | None, sent: int, response: ROBisResponse):
+        self.outbox_inflight.pop(call, None)
+        latency = (time.perf_counter() - started) * 1000
+        self.metrics.record(f"upload {kind}", latency, sent, len(response.content), not response.ok)
+        ids = [row[0] for row in rows]
+
+        status = response.status_code
+        retry = not response.ok and (status is None or status >= 500 or status in (408, 429))
+
+        split = not response.ok and not retry and kind == "online" and len(rows) > 1
+
+        if response.ok:
+            outbox.done(ids)
+            self.online_solo.difference_update(ids)
+            if digest:
+                outbox.set_uploaded(kind, rows[0][2], digest)
+            if kind == "online" and rows[0][2] == self.online_apikey:
+                self.online_sent.update({row[3]: row[6] for row in rows})
+        elif retry:
+            outbox.failed(ids)
+            self.metrics.count(f"opakování {kind}")
+        elif split:
+            # One bad record or an oversized body must not cost the whole batch, the rows go out one by one.
+            self.online_solo.update(ids)
+            self.metrics.count("rozděleno online")
+        else:
+            # ROBis rejected the payload itself, sending it again would not help.
+            outbox.done(ids)
+            self.online_solo.difference_update(ids)
+            self.metrics.count(f"odmítnuto {kind}")
+        self.metrics.gauge("fronta outbox", outbox.count())
+
+        size = f"{len(rows)} záv." if kind == "online" else f"HTTP {status}"
+        self.log.append(
+            f"{datetime.now().strftime("%H:%M:%S")} - {OUTBOX_LABELS[kind]}: {"OK" if response.ok else f"ERROR: {response.error}"}{" (zkusím znovu)" if retry else ""}{" (posílám po jednom)" if split else ""} ({size}, {latency:.0f} ms, ve frontě {outbox.count()}) {response.text}"
+        )
+
+        if not retry and outbox is self.outbox:
+            if response.ok:
+                outbox.wake()
+            self._drain_outbox()
+
+    def _send_online_readout(self, db, si: int, all: bool = False):
+        # The readout's own punches were already reported by the tracker.
+        self.dirty_punches.discard(si)
+        if not self.readout_worker.isRunning():
+            self.readout_worker.start()
+        self.readout_worker.enqueue(db, si, all)
+
+    def _mark_dirty(self, bind, punches: set, runners: set, categories: set):
+        if bind is not getattr(self.mw, "db", None):
+            return
+        self.dirty_punches |= punches
+        self.dirty_runners |= runners
+        self.dirty_categories |= categories
+        if not self.dirty_timer.isActive():
+            self.dirty_timer.start()
+
+    def _flush_dirty(self):
+        if not (self.dirty_punches or self.dirty_runners or self.dirty_categories):
+            return
+        if not self.readout_worker.isRunning():
+            self.readout_worker.start()
+        self.readout_worker.enqueue_changes(self.mw.db, self.dirty_punches, self.dirty_runners, self.dirty_categories)
+        self.metrics.count("změny v databázi", len(self.dirty_punches) + len(self.dirty_runners) + len(self.dirty_categories))
+        self.dirty_punches = set()
+        self.dirty_runners = set()
+        self.dirty_categories = set()
+
+    def _queue_online(self, apikey: str, changed: list, all: bool):
+        if apikey != self.online_apikey:
+            self.online_sent.clear()
+            self.online_apikey = apikey
+
+        outbox = self._get_outbox()
+        pending = outbox.bodies("online", apikey)
+        items = []
+
+        for key, serialized, read_out in changed:
+            # Besides the read-out runners, only resend competitors ROBis already has.
+            if not all and not read_out and key not in self.online_sent:
+                continue
+            queued = pending.get(key)
+            if queued == serialized or (queued is None and self.online_sent.get(key) == serialized):
+                continue
+            items.append((key, serialized))
+
+        if all:
+            self.log.append(
+                f"{datetime.now().strftime("%H:%M:%S")} - Online výsledky: aktualizace všech, změněno {len(items)} z {len(changed)} záv.")
+
+        if not items:
+            return
+
+        outbox.put_many("online", apikey, "PUT", "/api/results/?name=json", items)
+        queued = len(pending.keys() | {key for key, _ in items})
+        self.metrics.gauge("fronta online", queued)
 
-            self.nmmanager.put(request, byte_data)
+        # A full refresh goes out right away, in ONLINE_BATCH_MAX sized requests.
+        if all or queued >= ONLINE_BATCH_MAX:
+            self._flush_online()
+        elif not self.online_timer.isActive():
+            self.online_timer.start()